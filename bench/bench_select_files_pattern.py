@@ -0,0 +1,75 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+# Micro-benchmark for select_files() in plugins/module_utils/util_select_files_pattern.py
+#
+#   python bench/bench_select_files_pattern.py                        current select_files
+#   python bench/bench_select_files_pattern.py --baseline <git-rev>   current against select_files at <git-rev>
+
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+UTIL = "plugins/module_utils/util_select_files_pattern.py"
+PATTERNS = ("file*", "*.txt", "file*.txt", "file*.t*", "file.txt")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_util(_path, _name):
+    spec = importlib.util.spec_from_file_location(_name, _path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_util_at(_revision):
+    source = subprocess.run(["git", "show", f"{_revision}:{UTIL}"], cwd=ROOT, check=True, capture_output=True).stdout
+    with tempfile.NamedTemporaryFile("wb", suffix=".py", delete=False) as util_file:
+        util_file.write(source)
+    try:
+        return load_util(util_file.name, "baseline_select_files_pattern")
+    finally:
+        os.remove(util_file.name)
+
+
+def file_names(_count):
+    # A few prefixes and extensions, every name has one dot so patterns the old engine supports return full results
+    prefixes = ("file", "report", "data", "file_backup")
+    extensions = ("txt", "csv", "tmp", "json")
+    return [f"{prefixes[i % 4]}{i}.{extensions[(i // 4) % 4]}" for i in range(_count)]
+
+
+def best_time(_select_files, _pattern, _names, _repeat):
+    times = []
+    for _ in range(_repeat):
+        start = time.perf_counter()
+        _select_files(_pattern, _names)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="select_files() micro-benchmark")
+    parser.add_argument("--names", type=int, default=1000000, help="number of file names")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per pattern, the best one is reported")
+    parser.add_argument("--baseline", default="", help="git revision to compare with")
+    args = parser.parse_args()
+
+    names = file_names(args.names)
+    current = load_util(os.path.join(ROOT, UTIL), "current_select_files_pattern")
+    baseline = load_util_at(args.baseline) if args.baseline else None
+    print(f"{args.names} names, best of {args.repeat}")
+    for pattern in PATTERNS:
+        new = best_time(current.select_files, pattern, names, args.repeat)
+        if baseline:
+            old = best_time(baseline.select_files, pattern, names, args.repeat)
+            print(f"  {pattern:<10} {old:.3f}s -> {new:.3f}s")
+        else:
+            print(f"  {pattern:<10} {new:.3f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import threading
+import requests
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.fileshare import ShareServiceClient
+
+# Clients built in this module run, all of them share one pooled transport
+_clients_lock = threading.Lock()
+_client_settings = {"pool_size": 10, "config": {}}
+_transport = {}
+_service_clients = {}
+_share_clients = {}
+_accounts = {}
+
+
+def parse_connection_string(_connection_string):
+    return dict(part.split("=", 1) for part in _connection_string.split(";") if "=" in part)
+
+
+def get_account(_connection_string):
+    # Connection strings are parsed once per module run
+    if _connection_string not in _accounts:
+        settings = parse_connection_string(_connection_string)
+        _accounts[_connection_string] = (settings.get("AccountName"), settings.get("FileEndpoint"))
+
+    return _accounts[_connection_string]
+
+
+def configure_clients(_pool_size, **_config):
+    # Must run before the first client is built. Pool size should match the transfer concurrency,
+    # _config is passed to the service client (e.g. max_single_get_size, max_chunk_get_size)
+    _client_settings["pool_size"] = max(int(_pool_size or 1), 1)
+    _client_settings["config"] = _config
+
+
+def get_transport():
+    if "transport" not in _transport:
+        pool_size = _client_settings["pool_size"]
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _transport["transport"] = RequestsTransport(session=session, session_owner=False)
+
+    return _transport["transport"]
+
+
+def get_service_client(_connection_string):
+    # Clients are keyed by the whole connection string, the same account with another key or SAS gets its own client
+    with _clients_lock:
+        if _connection_string not in _service_clients:
+            _service_clients[_connection_string] = ShareServiceClient.from_connection_string(_connection_string, transport=get_transport(),
+                                                                                            **_client_settings["config"])
+
+        return _service_clients[_connection_string]
+
+
+def get_share_client(_connection_string, _share):
+    key = (_connection_string, _share)
+    service = get_service_client(_connection_string)
+    with _clients_lock:
+        if key not in _share_clients:
+            # Share clients built from the service client reuse its transport and configuration
+            _share_clients[key] = service.get_share_client(_share)
+
+        return _share_clients[key]
@@ -0,0 +1,51 @@
+import azure.core.exceptions as aze
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_thread_pool import run_in_pool
+
+# Directories created or found in this module run, keyed by (share url, directory)
+_existing_directories = set()
+
+
+def create_tree_directory(_share_client, _directory):
+    # Create one directory, an existing directory counts as success
+    key = (_share_client.url, _directory)
+    if key in _existing_directories:
+        return {"name": _directory, "status": True, "action": "exists", "msg": f"Directory <{_directory}> already exist"}
+    try:
+        _share_client.get_directory_client(directory_path=_directory).create_directory()
+        status = True
+        action = "created"
+        msg_ret = f"Directory <{_directory}> created"
+    except aze.ResourceExistsError:
+        status = True
+        action = "exists"
+        msg_ret = f"Directory <{_directory}> already exist"
+    except aze.ResourceNotFoundError:
+        status = False
+        action = "failed"
+        msg_ret = f"Directory <{_directory}> not created. Parent Directory does not exist"
+    except Exception as error:
+        status = False
+        action = "failed"
+        msg_ret = f"Directory <{_directory}> not created. Error: <{error}>"
+    if status:
+        _existing_directories.add(key)
+
+    return {"name": _directory, "status": status, "action": action, "msg": msg_ret}
+
+
+def create_directory_tree(_share_client, _directories, _max_concurrency, _parents=True, _root=""):
+    # Create _directories one depth level at a time, directories of the same level at the same time.
+    # With _parents every missing ancestor is created first. _root is an existing path prefixed to every directory.
+    # Return one result per created or checked directory, keyed by its full path
+    levels = {}
+    for directory in _directories:
+        parts = directory.split("/")
+        for depth in range(1 if _parents else len(parts), len(parts) + 1):
+            levels.setdefault(depth, set()).add(_root + "/".join(parts[:depth]))
+    results = {}
+    for depth in sorted(levels):
+        for result in run_in_pool(lambda directory: create_tree_directory(_share_client, directory), sorted(levels[depth]),
+                                  _max_concurrency):
+            results[result['name']] = result
+
+    return results
@@ -1,20 +1,28 @@
-from azure.storage.fileshare import ShareClient
 import azure.core.exceptions as aze
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_shares import list_shares_in_service
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import get_share_client
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_share_exists import share_exists
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_walk_share import walk_share
 
 
-def list_directories_in_share(_account_name, _connection_string, _share, _dir):
+def directory_entry(_name, _directory):
+    return {"name": _name, "file_id": _directory['file_id'], "is_directory": _directory['is_directory']}
+
+
+def list_directories_in_share(_account_name, _connection_string, _share, _dir, _recursive=False, _max_concurrency=8):
     output = []
-    status, msg_ret, shares_in_service = list_shares_in_service(_account_name, _connection_string)
-    if status:
-        share_exist = [share_name for share_name in shares_in_service if share_name == _share]
-    if len(share_exist) == 1:
-        share = ShareClient.from_connection_string(_connection_string, _share)
+    status, msg_ret, share_found = share_exists(_account_name, _connection_string, _share)
+    if not status:
+        return status, msg_ret, output
+    if share_found:
+        share = get_share_client(_connection_string, _share)
         try:
-            # List directories in share
-            my_files = {"results": list(share.list_directories_and_files(directory_name=_dir))}
+            # List directories in share, or the whole tree under the path with names relative to it
+            if _recursive:
+                my_files = {"results": walk_share(share, _dir, _max_concurrency)}
+            else:
+                my_files = {"results": [(file['name'], file) for file in share.list_directories_and_files(directory_name=_dir)]}
             status = True
-            output = [{"name": file['name'],"file_id": file['file_id'],"is_directory": file['is_directory']} for file in my_files['results'] if file['is_directory']]
+            output = [directory_entry(name, file) for name, file in my_files['results'] if file['is_directory']]
             if len(output) == 0:
                 msg_ret = f"No Directories found for path <{_dir}> in share <{_share}>"
             else:
@@ -29,4 +37,37 @@ def list_directories_in_share(_account_name, _connection_string, _share, _dir):
         msg_ret = f"List of Directories not created for path <{_dir}> in share <{_share}>. Error: Share not found"
         status = False
 
-    return status, msg_ret, output
\ No newline at end of file
+    return status, msg_ret, output
+
+
+def list_directories_page_in_share(_account_name, _connection_string, _share, _dir, _max_results, _continuation_token=None):
+    # One page of up to _max_results entries, next_marker continues the listing on the next call, empty when done
+    output = []
+    next_marker = ""
+    status, msg_ret, share_found = share_exists(_account_name, _connection_string, _share)
+    if not status:
+        return status, msg_ret, output, next_marker
+    if not share_found:
+        status = False
+        msg_ret = f"List of Directories not created for path <{_dir}> in share <{_share}>. Error: Share not found"
+        return status, msg_ret, output, next_marker
+    share = get_share_client(_connection_string, _share)
+    try:
+        pages = share.list_directories_and_files(directory_name=_dir,
+                                                 results_per_page=_max_results).by_page(continuation_token=_continuation_token or None)
+        page = next(pages, [])
+        output = [directory_entry(file['name'], file) for file in page if file['is_directory']]
+        next_marker = pages.continuation_token or ""
+        status = True
+        if len(output) == 0:
+            msg_ret = f"No Directories found in page for path <{_dir}> in share <{_share}>"
+        else:
+            msg_ret = f"Page of Directories created for path <{_dir}> in share <{_share}>"
+    except aze.ResourceNotFoundError:
+        msg_ret = f"List of Directories not created for path <{_dir}> in share <{_share}>. Error: path not found"
+        status = False
+    except Exception as error:
+        status = False
+        msg_ret = f"Page of Directories not created for path <{_dir}> in share <{_share}>. Error: <{error}>"
+
+    return status, msg_ret, output, next_marker
@@ -1,27 +1,48 @@
-from azure.storage.fileshare import ShareClient
+import json
 import azure.core.exceptions as aze
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_shares import list_shares_in_service
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import get_share_client
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_share_exists import share_exists
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_walk_share import walk_share, iter_share
 
 
+# Extended fields are returned by the listing call itself, no per-file properties call is needed
+LIST_OPTIONS = {"include": ["timestamps", "Etag", "Attributes", "PermissionKey"], "include_extended_info": True}
 
-def list_files_in_share(_account_name, _connection_string, _share, _dir):
+
+def iso_time(_time):
+    return _time.isoformat() if _time else None
+
+
+def file_entry(_name, _file):
+    return {"name": _name, "size": _file['size'], "file_id": _file['file_id'], "is_directory": _file['is_directory'],
+            "last_modified": iso_time(_file['last_modified']), "etag": _file['etag'],
+            "creation_time": iso_time(_file['creation_time']), "last_write_time": iso_time(_file['last_write_time']),
+            "last_access_time": iso_time(_file['last_access_time']), "change_time": iso_time(_file['change_time']),
+            "file_attributes": _file['file_attributes'], "permission_key": _file['permission_key']}
+
+
+def list_files_in_share(_account_name, _connection_string, _share, _dir, _recursive=False, _max_concurrency=8, _name_prefix=""):
     output = {}
-    status, msg_ret, shares_in_service = list_shares_in_service(_account_name, _connection_string)
-    if status:
-        share_exist = [share_name for share_name in shares_in_service if share_name == _share]
-    if len(share_exist) != 1:
+    status, msg_ret, share_found = share_exists(_account_name, _connection_string, _share)
+    if not status:
+        return status, msg_ret, []
+    if not share_found:
         status = False
         msg_ret = f"Invalid File Share name: <{_share}>. Share does not exist in Account Storage <{_account_name}>"
         return status, msg_ret, []
     else:
-        share = ShareClient.from_connection_string(_connection_string, _share)
+        share = get_share_client(_connection_string, _share)
         try:
-            # List files in the directory
-            my_files = {"results": list(share.list_directories_and_files(directory_name=_dir))}
+            # List files in the directory, or in the whole tree under it with names relative to it
+            if _recursive:
+                my_files = {"results": walk_share(share, _dir, _max_concurrency, **LIST_OPTIONS)}
+            else:
+                # A name prefix is filtered by the service, only matching entries are transferred
+                my_files = {"results": [(file['name'], file) for file in
+                                        share.list_directories_and_files(directory_name=_dir, name_starts_with=_name_prefix or None,
+                                                                         **LIST_OPTIONS)]}
             status = True
-            output = [{"name": file['name'], "size": file['size'], "file_id": file['file_id'],
-                        "is_directory": file['is_directory']} for file in my_files['results'] if
-                        not file['is_directory']]
+            output = [file_entry(name, file) for name, file in my_files['results'] if not file['is_directory']]
             if len(output) == 0:
                 msg_ret = f"No Files found for path <{_dir}> in share <{_share}>"
             else:
@@ -33,4 +54,73 @@ def list_files_in_share(_account_name, _connection_string, _share, _dir):
             status = False
             msg_ret = f"List of Files not created for path <{_dir}> in share <{_share}>. Error: <{error}>"
 
-    return status, msg_ret, output
\ No newline at end of file
+    return status, msg_ret, output
+
+
+def list_files_page_in_share(_account_name, _connection_string, _share, _dir, _max_results, _continuation_token=None):
+    # One page of up to _max_results entries, next_marker continues the listing on the next call, empty when done
+    output = []
+    next_marker = ""
+    status, msg_ret, share_found = share_exists(_account_name, _connection_string, _share)
+    if not status:
+        return status, msg_ret, output, next_marker
+    if not share_found:
+        status = False
+        msg_ret = f"Invalid File Share name: <{_share}>. Share does not exist in Account Storage <{_account_name}>"
+        return status, msg_ret, output, next_marker
+    share = get_share_client(_connection_string, _share)
+    try:
+        pages = share.list_directories_and_files(directory_name=_dir, **LIST_OPTIONS,
+                                                 results_per_page=_max_results).by_page(continuation_token=_continuation_token or None)
+        page = next(pages, [])
+        output = [file_entry(file['name'], file) for file in page if not file['is_directory']]
+        next_marker = pages.continuation_token or ""
+        status = True
+        if len(output) == 0:
+            msg_ret = f"No Files found in page for path <{_dir}> in share <{_share}>"
+        else:
+            msg_ret = f"Page of Files created for path <{_dir}> in share <{_share}>"
+    except aze.ResourceNotFoundError:
+        msg_ret = f"No files to list for path <{_dir}> in share <{_share}> ,path not found"
+        status = False
+    except Exception as error:
+        status = False
+        msg_ret = f"Page of Files not created for path <{_dir}> in share <{_share}>. Error: <{error}>"
+
+    return status, msg_ret, output, next_marker
+
+
+def stream_files_in_share(_account_name, _connection_string, _share, _dir, _output_file, _recursive=False, _max_concurrency=8):
+    # Write one JSON line per file to _output_file as listing pages arrive, only summary counts are kept in memory
+    output = {"output_file": _output_file, "files": 0, "total_size": 0}
+    status, msg_ret, share_found = share_exists(_account_name, _connection_string, _share)
+    if not status:
+        return status, msg_ret, output
+    if not share_found:
+        status = False
+        msg_ret = f"Invalid File Share name: <{_share}>. Share does not exist in Account Storage <{_account_name}>"
+        return status, msg_ret, output
+    share = get_share_client(_connection_string, _share)
+    try:
+        if _recursive:
+            entries = iter_share(share, _dir, _max_concurrency, **LIST_OPTIONS)
+        else:
+            entries = ((file['name'], file) for file in share.list_directories_and_files(directory_name=_dir,
+                                                                                          **LIST_OPTIONS))
+        with open(_output_file, "w") as data:
+            for name, file in entries:
+                if file['is_directory']:
+                    continue
+                data.write(json.dumps(file_entry(name, file)) + "\n")
+                output['files'] += 1
+                output['total_size'] += file['size'] or 0
+        status = True
+        msg_ret = f"List of Files for path <{_dir}> in share <{_share}> written to <{_output_file}>"
+    except aze.ResourceNotFoundError:
+        msg_ret = f"No files to list for path <{_dir}> in share <{_share}> ,path not found"
+        status = False
+    except Exception as error:
+        status = False
+        msg_ret = f"List of Files not written to <{_output_file}> for path <{_dir}> in share <{_share}>. Error: <{error}>"
+
+    return status, msg_ret, output
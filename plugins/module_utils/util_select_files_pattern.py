@@ -1,59 +1,104 @@
+import os
 import re
+from functools import lru_cache
+
+ALL_FILES_PATTERNS = ("*.*", "*", "**")
+
+def pattern_prefix(_file_pattern):
+    # Literal part of the pattern before its first wildcard, every name matching the pattern starts with it
+    if isinstance(_file_pattern, (list, tuple)):
+        # Names matching any of the patterns start with their common prefix
+        return os.path.commonprefix([pattern_prefix(pattern) for pattern in _file_pattern]) if _file_pattern else ""
+    return re.split(r"[\*\?\[]", _file_pattern, maxsplit=1)[0]
+
+@lru_cache(maxsize=64)
+def compile_pattern(_file_pattern):
+    # Translate a glob pattern to a compiled regex: ** matches any run of characters including "/",
+    # * any run of characters but "/", ? one character but "/", [...] and [!...] a character class
+    parts = []
+    i = 0
+    n = len(_file_pattern)
+    while i < n:
+        char = _file_pattern[i]
+        if char == "*":
+            if _file_pattern.startswith("**/", i):
+                parts.append("(?:.*/)?")
+                i += 3
+            elif _file_pattern.startswith("**", i):
+                parts.append(".*")
+                i += 2
+            else:
+                parts.append("[^/]*")
+                i += 1
+            continue
+        if char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            j = i + 1
+            if j < n and _file_pattern[j] in "!^":
+                j += 1
+            if j < n and _file_pattern[j] == "]":
+                j += 1
+            while j < n and _file_pattern[j] != "]":
+                j += 1
+            if j >= n:
+                # unclosed class, "[" is a literal
+                parts.append(re.escape(char))
+            else:
+                char_class = _file_pattern[i + 1:j]
+                negate = char_class[0] in "!^"
+                if negate:
+                    char_class = char_class[1:]
+                # "\\" and "[" are literal in a glob class, doubled set operators are reserved by re for nested sets
+                char_class = char_class.replace("\\", "\\\\").replace("[", "\\[")
+                char_class = re.sub(r"([&~|-])\1+", lambda operator: re.sub(r"(.)", r"\\\1", operator.group(0)), char_class)
+                parts.append("[" + ("^" if negate else "") + char_class + "]")
+                i = j
+        else:
+            parts.append(re.escape(char))
+        i += 1
+
+    return re.compile("".join(parts) + r"\Z", re.DOTALL)
 
 def select_files(_file_pattern, _files_in_dir):
     msg_ret = f"Files selection done for <{_file_pattern}>"
     status = True
-    name_and_exension_pattern = re.split(r"\.", _file_pattern)
-    pattern_file_ext = name_and_exension_pattern[1] if len(name_and_exension_pattern) == 2 else []
-    pattern_file_name = name_and_exension_pattern[0]
     try:
-        if _file_pattern == "*.*":  # *.*
-            return status, msg_ret, _files_in_dir
-        elif len(name_and_exension_pattern) == 1:  # file*
-            file_name_pattern = re.split(r"\*", pattern_file_name)[0]
-            return status, msg_ret, [file for file in _files_in_dir if re.split(r"\.", file)[0].startswith(file_name_pattern)]
-        elif len(name_and_exension_pattern) == 2:
-            if pattern_file_name.startswith("*") and not "*" in pattern_file_ext:  # *.txt
-                return status, msg_ret, [file for file in _files_in_dir if len(re.split(r"\.", file)) == 2 and
-                                            pattern_file_ext == re.split(r"\.", file)[1]]
-            elif pattern_file_ext.startswith("*") and not "*" in pattern_file_name:  # file.*
-                return status, msg_ret, [file for file in _files_in_dir if pattern_file_name == re.split(r"\.", file)[0]]
-            elif "*" in pattern_file_name and not "*" in pattern_file_ext:  # file*.txt
-                name_pattern = re.split(r"\*", pattern_file_name)[0]
-                return status, msg_ret, [file for file in _files_in_dir if
-                                            len(re.split(r"\.", file)) == 2 and file.startswith(name_pattern) and
-                                            pattern_file_ext == re.split(r"\.", file)[1]]
-            elif not "*" in pattern_file_name and "*" in pattern_file_ext:  # file.t*
-                file_ext_pattern = re.split(r"\*", pattern_file_ext)[0]
-                return status, msg_ret, [file for file in _files_in_dir if pattern_file_name == re.split(r"\.", file)[0]
-                                            and len(re.split(r"\.", file)) == 2 and 
-                                            file_ext_pattern in re.split(r"\.", file)[1]]
-            elif "*" in pattern_file_name and "*" in pattern_file_ext:  # file*.t*
-                file_name_pattern = re.split(r"\*", pattern_file_name)[0]
-                file_ext_pattern = re.split(r"\*", pattern_file_ext)[0]
-                return status, msg_ret, [file for file in _files_in_dir if re.split(r"\.", file)[0].startswith(file_name_pattern)
-                                            and re.split(r"\.", file)[1].startswith(file_ext_pattern)]
-            elif "*" in pattern_file_name and pattern_file_ext == "*":  # file*.*
-                file_name_pattern = re.split(r"\*", pattern_file_name)[0]
-                file_ext_pattern = pattern_file_ext
-                return status, msg_ret, [file for file in _files_in_dir if
-                                            re.split(r"\.", file)[0].startswith(file_name_pattern)
-                                            and re.split(r"\.", file)[1] == "*"]
-            elif not "*" in pattern_file_name and not "*" in pattern_file_ext:  # file.txt
-                file_name_pattern = pattern_file_name
-                file_ext_pattern = pattern_file_ext
-                return status, msg_ret, [file for file in _files_in_dir if file_name_pattern == re.split(r"\.", file)[0]
-                                            and len(re.split(r"\.", file)) == 2 and 
-                                            file_ext_pattern == re.split(r"\.", file)[1]]
-            else:
-                status = False
-                msg_ret = f"Invalid file name: <{_file_pattern}>"
-                return status, msg_ret, []
-        else:
+        if not _file_pattern:
             status = False
             msg_ret = f"Invalid file name: <{_file_pattern}>"
             return status, msg_ret, []
+        if _file_pattern in ALL_FILES_PATTERNS:  # every file, names without extension included
+            return status, msg_ret, list(_files_in_dir)
+        # Pattern is compiled once, names are filtered in a single pass
+        match = compile_pattern(_file_pattern).match
+        return status, msg_ret, [file for file in _files_in_dir if match(file)]
     except Exception as error:
         status = False
         msg_ret = f"Files selection failed for <{_file_pattern}> pattern, error: <{error.args}>"
-        return status, msg_ret, []
\ No newline at end of file
+        return status, msg_ret, []
+
+
+@lru_cache(maxsize=64)
+def compile_patterns(_file_patterns):
+    # One regex for a tuple of patterns, a name matches it when it matches any of them
+    regexes = [".*" if pattern in ALL_FILES_PATTERNS else compile_pattern(pattern).pattern for pattern in _file_patterns]
+    return re.compile("|".join(f"(?:{regex})" for regex in regexes), re.DOTALL)
+
+def select_files_multi(_include, _exclude, _files_in_dir):
+    msg_ret = f"Files selection done for include <{_include}> and exclude <{_exclude}>"
+    status = True
+    try:
+        if len(_include) == 0 or not all(_include) or not all(_exclude):
+            status = False
+            msg_ret = f"Invalid file name in include <{_include}> or exclude <{_exclude}>"
+            return status, msg_ret, []
+        # Every pattern is checked against the same listing in a single pass
+        include = None if any(pattern in ALL_FILES_PATTERNS for pattern in _include) else compile_patterns(tuple(_include)).match
+        exclude = compile_patterns(tuple(_exclude)).match if len(_exclude) > 0 else None
+        return status, msg_ret, [file for file in _files_in_dir if (include is None or include(file))
+                                 and (exclude is None or not exclude(file))]
+    except Exception as error:
+        status = False
+        msg_ret = f"Files selection failed for include <{_include}> and exclude <{_exclude}>, error: <{error.args}>"
+        return status, msg_ret, []
@@ -0,0 +1,28 @@
+import azure.core.exceptions as aze
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import get_share_client
+
+# Shares already checked in this module run, keyed by (connection string, share)
+_checked_shares = {}
+
+
+def share_exists(_account_name, _connection_string, _share):
+    key = (_connection_string, _share)
+    try:
+        if key not in _checked_shares:
+            # One properties call on the target share, instead of listing every share in the account
+            try:
+                get_share_client(_connection_string, _share).get_share_properties()
+                _checked_shares[key] = True
+            except aze.ResourceNotFoundError:
+                _checked_shares[key] = False
+        status = True
+        if _checked_shares[key]:
+            msg_ret = f"Share <{_share}> found in account <{_account_name}>"
+        else:
+            msg_ret = f"Share <{_share}> not found in account <{_account_name}>"
+    except Exception as error:
+        status = False
+        msg_ret = f"Share <{_share}> not checked in account <{_account_name}>. Error: <{error}>"
+        return status, msg_ret, False
+
+    return status, msg_ret, _checked_shares[key]
@@ -0,0 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run_in_pool(_function, _items, _max_concurrency):
+    # Run _function over _items with at most _max_concurrency workers, results keep _items order
+    items = list(_items)
+    if len(items) == 0:
+        return []
+    workers = max(1, min(int(_max_concurrency or 1), len(items)))
+    if workers == 1:
+        return [_function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_function, items))
@@ -0,0 +1,60 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iter_share(_share_client, _dir, _max_concurrency, **_list_kwargs):
+    # Breadth-first walk under _dir with up to _max_concurrency directory listings in flight.
+    # Yield (path, entry) pairs for every file and directory as listing pages arrive, path relative to _dir.
+    # Workers hand over one page at a time through a bounded queue, so memory does not grow with directory size
+    workers = max(1, int(_max_concurrency or 1))
+    pages = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+
+    def put(_item):
+        while not stop.is_set():
+            try:
+                pages.put(_item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def list_directory(_rel_dir):
+        if stop.is_set():
+            return
+        directory = "/".join(part for part in (_dir, _rel_dir) if part)
+        try:
+            for page in _share_client.list_directories_and_files(directory_name=directory, **_list_kwargs).by_page():
+                if stop.is_set():
+                    return
+                put((_rel_dir, list(page), None))
+            # An empty page marks the directory as fully listed
+            put((_rel_dir, None, None))
+        except Exception as error:
+            put((_rel_dir, None, error))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        executor.submit(list_directory, "")
+        listing = 1
+        try:
+            while listing > 0:
+                rel_dir, page, error = pages.get()
+                if error is not None:
+                    raise error
+                if page is None:
+                    listing -= 1
+                    continue
+                for entry in page:
+                    path = rel_dir + "/" + entry['name'] if rel_dir else entry['name']
+                    if entry['is_directory']:
+                        listing += 1
+                        executor.submit(list_directory, path)
+                    yield path, entry
+        finally:
+            # Stop running and queued listings when the walk fails or the caller stops early
+            stop.set()
+
+
+def walk_share(_share_client, _dir, _max_concurrency, **_list_kwargs):
+    # Every (path, entry) pair of the tree under _dir, sorted by path
+    return sorted(iter_share(_share_client, _dir, _max_concurrency, **_list_kwargs), key=lambda path_entry: path_entry[0])
@@ -0,0 +1,374 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+module: o4n_azure_copy_files
+short_description: Copy files between paths, shares and accounts with server side copy
+description:
+  - Connect to Azure Storage file using connection string method
+  - Copy files from a path in a File Share to a path in the same or another File Share, in the same or another account
+  - Data is copied by the service, it never goes through the host running the task
+  - Return a list of copied files
+version_added: "2.1"
+author: "Ed Scrimaglia"
+notes:
+  - Testeado en linux
+requirements:
+  - ansible >= 2.10
+options:
+  account_name:
+    description:
+      Storage Account Name Provided by Azure Portal
+    required: true
+    type: string
+  connection_string:
+    description:
+      - String that include URL and Token to connect to Azure Storage Account. Provided by Azure Portal.
+      - Storage Account -> Access Keys -> Connection String
+    required: true
+    type: string
+  share:
+    description:
+      Name of the share where files to be copied are
+    required: true
+    type: string
+  files:
+    description:
+      - files to be copied
+      - Glob pattern, * any characters, ? one character, [abc] and [!abc] character classes, ** any characters including /
+      - '*.*' selects every file
+    required: false
+    type: string
+  include:
+    description:
+      - List of file patterns to select, same syntax as files. Used together with files when both are present
+      - Every pattern is checked against a single listing
+    required: false
+    type: list
+    elements: str
+  exclude:
+    description:
+      List of file patterns to leave out of the selection
+    required: false
+    type: list
+    elements: str
+  source_path:
+    description:
+      path, directory, where files to be copied are
+    required: false
+    type: string
+  dest_share:
+    description:
+      Name of the share where files must be copied. Default is share
+    required: false
+    type: string
+  dest_path:
+    description:
+      - path, directory, where files must be copied. It must exist
+      - Source and destination can not be the same path in the same share
+    required: false
+    type: string
+  dest_account_name:
+    description:
+      Storage Account Name of the destination. Default is account_name
+    required: false
+    type: string
+  dest_connection_string:
+    description:
+      - Connection String of the destination account. Default is connection_string
+      - When accounts differ or dest_connection_string is not a Shared Key connection string, source files are read through a read only SAS
+        built from the AccountKey of connection_string, or through the SAS of connection_string
+    required: false
+    type: string
+  max_concurrency:
+    description:
+      Maximum number of copies started or polled at the same time
+    required: false
+    type: int
+    default: 8
+  timeout:
+    description:
+      - Seconds to wait for pending copies to complete
+      - Copies still pending when it expires are aborted, the read only SAS of the source is valid a few minutes longer
+    required: false
+    type: int
+    default: 3600
+"""
+
+RETURN = """
+output:
+  description: List of files copied and one result per file, action copied, failed or aborted when timeout expires
+  type: dict
+  returned: allways
+  sample:
+    output: {
+      "changed": false,
+      "content": [
+          "report1.csv",
+          "report2.csv"
+      ],
+      "failed": false,
+      "msg": "Files copied from path <reports> in share <share-to-test> to path <archive> in share <share-archive>",
+      "results": [
+          {
+              "action": "copied",
+              "copy_id": "00000000-0000-0000-0000-000000000001",
+              "msg": "File <report1.csv> copied to <archive/report1.csv>",
+              "name": "report1.csv",
+              "status": true
+          },
+          {
+              "action": "copied",
+              "copy_id": "00000000-0000-0000-0000-000000000002",
+              "msg": "File <report2.csv> copied to <archive/report2.csv>",
+              "name": "report2.csv",
+              "status": true
+          }
+      ]
+    }
+"""
+
+EXAMPLES = """
+tasks:
+  - name: Copy files to another path in the same share
+    o4n_azure_copy_files:
+      account_name: "{{ account_name }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      source_path: /reports
+      files: "*.csv"
+      dest_path: /archive
+    register: output
+
+  - name: Copy files to another share
+    o4n_azure_copy_files:
+      account_name: "{{ account_name }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      source_path: /reports
+      include:
+        - "*.csv"
+        - "*.json"
+      dest_share: share-archive
+      dest_path: /2023
+      max_concurrency: 32
+    register: output
+
+  - name: Copy files to a share in another account
+    o4n_azure_copy_files:
+      account_name: "{{ account_name }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      source_path: /reports
+      files: "*.*"
+      dest_account_name: "{{ backup_account_name }}"
+      dest_connection_string: "{{ backup_connection_string }}"
+      dest_share: share-backup
+    register: output
+"""
+
+import time
+from datetime import datetime, timedelta
+from azure.storage.fileshare import generate_file_sas, FileSasPermissions
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_share_exists import share_exists
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import configure_clients, get_share_client, get_account, parse_connection_string
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_files import list_files_in_share
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_select_files_pattern import select_files_multi, pattern_prefix
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_get_right_path import right_path
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_thread_pool import run_in_pool
+
+
+def source_url(_file_client, _connection_string, _share, _source_file, _source_sas, _expiry):
+    if not _source_sas:
+        # Same account with Shared Key, the service authorizes the source with the destination credentials
+        return _file_client.url
+    settings = parse_connection_string(_connection_string)
+    if not settings.get("AccountKey"):
+        # SAS connection strings already carry their token in the client url
+        return _file_client.url
+    sas = generate_file_sas(settings['AccountName'], _share, _source_file.split("/"), settings['AccountKey'],
+                            permission=FileSasPermissions(read=True), expiry=_expiry)
+
+    return _file_client.url.split("?")[0] + "?" + sas
+
+
+def start_copy(_source_share, _dest_share, _source_file, _dest_file, _file_name, _connection_string, _share, _source_sas, _expiry):
+    copy_id = None
+    try:
+        source = _source_share.get_file_client(_source_file)
+        copy = _dest_share.get_file_client(_dest_file).start_copy_from_url(
+            source_url(source, _connection_string, _share, _source_file, _source_sas, _expiry))
+        copy_id = copy['copy_id']
+        status = copy['copy_status'] in ("success", "pending")
+        action = "copied" if copy['copy_status'] == "success" else copy['copy_status']
+        msg_ret = f"File <{_file_name}> copy to <{_dest_file}> <{copy['copy_status']}>"
+    except Exception as error:
+        status = False
+        action = "failed"
+        msg_ret = f"File <{_file_name}> not copied to <{_dest_file}>. Error: <{error}>"
+
+    return {"name": _file_name, "status": status, "action": action, "msg": msg_ret, "copy_id": copy_id}
+
+
+def poll_copy(_dest_share, _dest_file, _file_name, _copy_id):
+    try:
+        copy_status = _dest_share.get_file_client(_dest_file).get_file_properties().copy.status
+        status = copy_status in ("success", "pending")
+        action = "copied" if copy_status == "success" else copy_status
+        msg_ret = f"File <{_file_name}> copy to <{_dest_file}> <{copy_status}>"
+    except Exception as error:
+        status = False
+        action = "failed"
+        msg_ret = f"File <{_file_name}> copy to <{_dest_file}> not checked. Error: <{error}>"
+
+    return {"name": _file_name, "status": status, "action": action, "msg": msg_ret, "copy_id": _copy_id}
+
+
+def abort_copy(_dest_share, _dest_file, _file_name, _copy_id, _timeout):
+    # A copy left running would keep writing a partial destination file after the task ends
+    try:
+        _dest_share.get_file_client(_dest_file).abort_copy(_copy_id)
+        action = "aborted"
+        msg_ret = f"File <{_file_name}> copy to <{_dest_file}> aborted, still pending after <{_timeout}> seconds"
+    except Exception as error:
+        action = "failed"
+        msg_ret = f"File <{_file_name}> copy to <{_dest_file}> still pending after <{_timeout}> seconds and not aborted. Error: <{error}>"
+
+    return {"name": _file_name, "status": False, "action": action, "msg": msg_ret, "copy_id": _copy_id}
+
+
+def copy_files(_account_name, _connection_string, _share, _source_path, _files, _exclude, _dest_account_name,
+               _dest_connection_string, _dest_share, _dest_path, _max_concurrency, _timeout):
+    found_files = []
+    results = []
+    _source_path = right_path(_source_path)
+    _dest_path = right_path(_dest_path)
+    if get_account(_connection_string) == get_account(_dest_connection_string) and _share == _dest_share and _source_path == _dest_path:
+        status = False
+        msg_ret = f"Files not copied, source and destination are the same path <{_source_path}> in share <{_share}>"
+        return status, msg_ret, found_files, results
+    # check if both shares exist
+    for account_name, connection_string, share_name in ((_account_name, _connection_string, _share),
+                                                        (_dest_account_name, _dest_connection_string, _dest_share)):
+        status, msg_ret, share_found = share_exists(account_name, connection_string, share_name)
+        if not status:
+            return status, msg_ret, found_files, results
+        if not share_found:
+            status = False
+            msg_ret = f"Invalid File Share name: <{share_name}>. Share does not exist in Account Storage <{account_name}>"
+            return status, msg_ret, found_files, results
+    # Copy files
+    try:
+        source_share = get_share_client(_connection_string, _share)
+        dest_share = get_share_client(_dest_connection_string, _dest_share)
+        # The source needs its own authorization unless the destination uses the Shared Key of the same account
+        source_sas = (get_account(_connection_string) != get_account(_dest_connection_string)
+                      or not parse_connection_string(_dest_connection_string).get("AccountKey"))
+        status, msg_ret, files_in_share = list_files_in_share(_account_name, _connection_string, _share, _source_path,
+                                                              _name_prefix=pattern_prefix(_files))
+        if status:
+            status, msg_ret, found_files = select_files_multi(_files, _exclude, [file['name'] for file in files_in_share if file])
+            if not status:
+                return status, msg_ret, found_files, results
+            s_path = _source_path + "/" if _source_path else ""
+            d_path = _dest_path + "/" if _dest_path else ""
+            if len(found_files) > 0:
+                # Copies still pending at the deadline are aborted, the source SAS outlives it so they can not fail before
+                deadline = time.time() + _timeout
+                expiry = datetime.utcnow() + timedelta(seconds=_timeout + 300)
+                # Start every copy, the service moves the data
+                results = run_in_pool(lambda file_name: start_copy(source_share, dest_share, s_path + file_name, d_path + file_name,
+                                                                   file_name, _connection_string, _share, source_sas, expiry),
+                                      found_files, _max_concurrency)
+                # Poll pending copies with exponential backoff until they complete or timeout expires
+                delay = 1
+                pending = [result for result in results if result['action'] == "pending"]
+                while len(pending) > 0 and time.time() < deadline:
+                    time.sleep(min(delay, max(deadline - time.time(), 0)))
+                    delay = min(delay * 2, 30)
+                    polled = {result['name']: result for result in
+                              run_in_pool(lambda result: poll_copy(dest_share, d_path + result['name'], result['name'], result['copy_id']),
+                                          pending, _max_concurrency)}
+                    results = [polled.get(result['name'], result) for result in results]
+                    pending = [result for result in polled.values() if result['action'] == "pending"]
+                if len(pending) > 0:
+                    aborted = {result['name']: result for result in
+                               run_in_pool(lambda result: abort_copy(dest_share, d_path + result['name'], result['name'], result['copy_id'], _timeout),
+                                           pending, _max_concurrency)}
+                    results = [aborted.get(result['name'], result) for result in results]
+                failed = [result['name'] for result in results if not result['status']]
+                found_files = [result['name'] for result in results if result['status']]
+                if len(failed) > 0:
+                    status = False
+                    msg_ret = f"Files not copied from path <{_source_path}> in share <{_share}> to path <{_dest_path}> in share <{_dest_share}>. <{len(failed)}> of <{len(results)}> copies failed"
+                else:
+                    status = True
+                    msg_ret = f"Files copied from path <{_source_path}> in share <{_share}> to path <{_dest_path}> in share <{_dest_share}>"
+            else:
+                status = False
+                msg_ret = f"Files not copied from path <{_source_path}> in share <{_share}>. No file to copy, File pattern <{_files}>"
+        else:
+            msg_ret = f"Invalid Directory: <{_source_path}> in File Share <{_share}>"
+            status = False
+    except Exception as error:
+        msg_ret = f"Files not copied to path <{_dest_path}> in share <{_dest_share}>. File pattern <{_files}>. Error: <{error}>"
+        status = False
+
+    return status, msg_ret, found_files, results
+
+
+def main():
+    module=AnsibleModule(
+        argument_spec=dict(
+            account_name=dict(required=True, type='str'),
+            share=dict(required=True, type='str'),
+            connection_string=dict(required=True, type='str'),
+            source_path=dict(required=False, type='str', default=''),
+            files=dict(required=False, type='str'),
+            include=dict(required=False, type='list', elements='str'),
+            exclude=dict(required=False, type='list', elements='str', default=[]),
+            dest_share=dict(required=False, type='str', default=''),
+            dest_path=dict(required=False, type='str', default=''),
+            dest_account_name=dict(required=False, type='str', default=''),
+            dest_connection_string=dict(required=False, type='str', default='', no_log=True),
+            max_concurrency=dict(required=False, type='int', default=8),
+            timeout=dict(required=False, type='int', default=3600)
+        ),
+        required_one_of=[['files', 'include']]
+    )
+
+    account_name = module.params.get("account_name")
+    share = module.params.get("share")
+    connection_string = module.params.get("connection_string")
+    source_path = module.params.get("source_path")
+    files = module.params.get("files")
+    include = module.params.get("include")
+    exclude = module.params.get("exclude")
+    dest_share = module.params.get("dest_share") or share
+    dest_path = module.params.get("dest_path")
+    dest_account_name = module.params.get("dest_account_name") or account_name
+    dest_connection_string = module.params.get("dest_connection_string") or connection_string
+    max_concurrency = module.params.get("max_concurrency")
+    timeout = module.params.get("timeout")
+    patterns = ([files] if files else []) + (include or [])
+
+    # One pooled transport for every client, sized to the copy concurrency
+    configure_clients(max_concurrency)
+    success, msg_ret, output, results = copy_files(account_name, connection_string, share, source_path, patterns, exclude,
+                                                   dest_account_name, dest_connection_string, dest_share, dest_path,
+                                                   max_concurrency, timeout)
+
+    if success:
+        module.exit_json(failed=False, msg=msg_ret, content=output, results=results)
+    else:
+        module.fail_json(failed=True, msg=msg_ret, content=output, results=results)
+
+
+if __name__ == "__main__":
+    main()
@@ -43,24 +43,36 @@ options:
     type: string
   files:
     description:
-      files to deleted from File ShRE
-    required: true
-    choices:
-      - 'file*'
-      - 'file*.txt'
-      - 'file*.tx*'
-      - 'file*.*'
-      - file.tx*
-      - '*.txt'
-      - 'file.*'
-      - '*.*'
-      - 'file.txt'
+      - files to be deleted from File Share
+      - Glob pattern, * any characters, ? one character, [abc] and [!abc] character classes, ** any characters including /
+      - '*.*' selects every file
+    required: false
     type: string
+  include:
+    description:
+      - List of file patterns to select, same syntax as files. Used together with files when both are present
+      - Every pattern is checked against a single listing
+    required: false
+    type: list
+    elements: str
+  exclude:
+    description:
+      List of file patterns to leave out of the selection
+    required: false
+    type: list
+    elements: str
+  max_concurrency:
+    description:
+      - Maximum number of files deleted at the same time
+      - Every file is tried, a failed file does not stop the others
+    required: false
+    type: int
+    default: 8
 """
 
 RETURN = """
 output:
-  description: List of files deleted
+  description: List of files deleted and one result per file, action is deleted, missing or failed
   type: dict
   returned: allways
   sample: 
@@ -68,11 +80,30 @@ output:
       "changed": false,
       "content": [
           "o4n_azure_list_directories.py",
-          "o4n_azure_list_files.py",
-          "o4n_azure_list_shares.py"
+          "o4n_azure_list_files.py"
       ],
       "failed": false,
-      "msg": "File deleted from Directory </dir1> in share <share-to-test2>"
+      "msg": "File deleted from Directory </dir1> in share <share-to-test2>. Deleted <2>, missing <1>",
+      "results": [
+          {
+              "action": "deleted",
+              "msg": "File <o4n_azure_list_directories.py> deleted",
+              "name": "o4n_azure_list_directories.py",
+              "status": true
+          },
+          {
+              "action": "deleted",
+              "msg": "File <o4n_azure_list_files.py> deleted",
+              "name": "o4n_azure_list_files.py",
+              "status": true
+          },
+          {
+              "action": "missing",
+              "msg": "File <o4n_azure_list_shares.py> not found",
+              "name": "o4n_azure_list_shares.py",
+              "status": true
+          }
+      ]
     }
 """
 
@@ -94,54 +125,90 @@ tasks:
       connection_string: "{{ connection_string }}"
       files: file*.*
     register: output
+
+  - name: Delete csv and json files but temporary ones
+    o4n_azure_delete_files:
+      account_name: "{{ account_name }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      path: /exports
+      include:
+        - "*.csv"
+        - "*.json"
+      exclude:
+        - "tmp*"
+    register: output
 """
 
-from azure.storage.fileshare import ShareClient
 import azure.core.exceptions as aze
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_shares import list_shares_in_service
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_share_exists import share_exists
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import configure_clients, get_share_client
 from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_files import list_files_in_share
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_select_files_pattern import select_files
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_select_files_pattern import select_files_multi, pattern_prefix
 from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_get_right_path import right_path
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_thread_pool import run_in_pool
+
+def delete_file(_share_client, _file_path, _file_name):
+    try:
+        _share_client.get_file_client(_file_path).delete_file()
+        status = True
+        action = "deleted"
+        msg_ret = f"File <{_file_name}> deleted"
+    except aze.ResourceNotFoundError:
+        # Already gone, the end state is the requested one
+        status = True
+        action = "missing"
+        msg_ret = f"File <{_file_name}> not found"
+    except Exception as error:
+        status = False
+        action = "failed"
+        msg_ret = f"File <{_file_name}> not deleted. Error: <{error}>"
+
+    return {"name": _file_name, "status": status, "action": action, "msg": msg_ret}
+
 
-def delete_files(_account_name, _connection_string, _share, _path, _files):
+def delete_files(_account_name, _connection_string, _share, _path, _files, _exclude, _max_concurrency):
     _path = right_path(_path)
     found_files = []
+    results = []
     # check if share and path exist in Account Storage
     try:
-      status, msg_ret, output = list_shares_in_service(_account_name, _connection_string)
+      status, msg_ret, share_found = share_exists(_account_name, _connection_string, _share)
       if status:
-          share_exist = [share for share in output if share == _share]
-          if len(share_exist) != 1:
+          if not share_found:
               status = False
               msg_ret = f"Invalid File Share name: <{_share}>. Share does not exist in Account Storage <{_account_name}>"
-              return status, msg_ret, found_files
+              return status, msg_ret, found_files, results
+      else:
+          return status, msg_ret, found_files, results
     except Exception as error:
         status = False
-        msg_ret = f"Invalid File Share name: <{_share}>. Listing Shares process failed"
-        return (status, msg_ret, found_files)
+        msg_ret = f"Invalid File Share name: <{_share}>. Checking Share process failed"
+        return (status, msg_ret, found_files, results)
     # Delete files
     try:
       # Instantiate the ShareFileClient from a connection string
-      share = ShareClient.from_connection_string(_connection_string, _share)
-      status, msg_ret, files_in_share = list_files_in_share(_account_name, _connection_string, _share, _path)
+      share = get_share_client(_connection_string, _share)
+      status, msg_ret, files_in_share = list_files_in_share(_account_name, _connection_string, _share, _path,
+                                                            _name_prefix=pattern_prefix(_files))
       if status:
-          status, msg_ret, found_files = select_files(_files,
+          status, msg_ret, found_files = select_files_multi(_files, _exclude,
                                           [file['name'] for file in files_in_share if file])
+          if not status:
+              return status, msg_ret, found_files, results
           path = _path + "/" if _path else ""
-          if len(found_files) > 1:
-              for file_name in found_files:
-                  file = share.get_file_client(path + file_name)
-                  # delete the file
-                  file.delete_file()
-              status = True
-              msg_ret = f"File deleted from Directory <{_path}> in share <{_share}>"
-          elif len(found_files) == 1:
-              file = share.get_file_client(path + found_files[0])
-              # delete the file
-              file.delete_file()
-              status = True
-              msg_ret = f"File deleted from Directory <{_path}> in share <{_share}>"
+          if len(found_files) > 0:
+              # Delete files concurrently, a failed file does not stop the others
+              results = run_in_pool(lambda file_name: delete_file(share, path + file_name, file_name), found_files, _max_concurrency)
+              failed = [result['name'] for result in results if result['action'] == "failed"]
+              missing = [result['name'] for result in results if result['action'] == "missing"]
+              found_files = [result['name'] for result in results if result['action'] == "deleted"]
+              status = len(failed) == 0
+              if status:
+                  msg_ret = f"File deleted from Directory <{_path}> in share <{_share}>. Deleted <{len(found_files)}>, missing <{len(missing)}>"
+              else:
+                  msg_ret = f"Files not deleted from Directory <{_path}> in share <{_share}>. Deleted <{len(found_files)}>, missing <{len(missing)}>, failed <{len(failed)}>"
           else:
               status = True
               msg_ret = f"Files not deleted from Directory <{_path}> in share <{_share}>. No file to delete"
@@ -155,7 +222,7 @@ def delete_files(_account_name, _connection_string, _share, _path, _files):
       msg_ret = f"File <{found_files}> not deleted from Directory <{_path}> in share <{_share}>. Error: <{error}>"
       status = False
 
-    return status, msg_ret, found_files
+    return status, msg_ret, found_files, results
 
 
 def main():
@@ -165,8 +232,12 @@ def main():
             share= dict(required=True, type='str'),
             connection_string=dict(required=True, type='str'),
             path=dict(required=False, type='str', default=''),
-            files=dict(required=True, type='str')
-        )
+            files=dict(required=False, type='str'),
+            include=dict(required=False, type='list', elements='str'),
+            exclude=dict(required=False, type='list', elements='str', default=[]),
+            max_concurrency=dict(required=False, type='int', default=8)
+        ),
+        required_one_of=[['files', 'include']]
     )
 
     share = module.params.get("share")
@@ -174,13 +245,19 @@ def main():
     account_name = module.params.get("account_name")
     path = module.params.get("path")
     files = module.params.get("files")
+    include = module.params.get("include")
+    exclude = module.params.get("exclude")
+    max_concurrency = module.params.get("max_concurrency")
+    patterns = ([files] if files else []) + (include or [])
 
-    success, msg_ret, output = delete_files(account_name, connection_string, share, path, files)
+    # One pooled transport for every client, sized to the delete concurrency
+    configure_clients(max_concurrency)
+    success, msg_ret, output, results = delete_files(account_name, connection_string, share, path, patterns, exclude, max_concurrency)
 
     if success:
-        module.exit_json(failed=False, msg=msg_ret, content=output)
+        module.exit_json(failed=False, msg=msg_ret, content=output, results=results)
     else:
-        module.fail_json(failed=True, msg=msg_ret, content=output)
+        module.fail_json(failed=True, msg=msg_ret, content=output, results=results)
 
 
 if __name__ == "__main__":
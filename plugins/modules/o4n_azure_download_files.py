@@ -38,19 +38,24 @@ options:
     type: string
   files:
     description:
-      files to deleted from File ShRE
-    required: true
-    choices:
-      - 'file*'
-      - 'file*.txt'
-      - 'file*.tx*'
-      - 'file*.*'
-      - file.tx*
-      - '*.txt'
-      - 'file.*'
-      - '*.*'
-      - 'file.txt'
+      - files to be downloaded from File Share
+      - Glob pattern, * any characters, ? one character, [abc] and [!abc] character classes, ** any characters including /
+      - '*.*' selects every file
+    required: false
     type: str
+  include:
+    description:
+      - List of file patterns to select, same syntax as files. Used together with files when both are present
+      - Every pattern is checked against a single listing
+    required: false
+    type: list
+    elements: str
+  exclude:
+    description:
+      List of file patterns to leave out of the selection
+    required: false
+    type: list
+    elements: str
   source_path:
     description:
       path, directory, where files that must be downloaded are
@@ -60,11 +65,49 @@ options:
       path, directory, where files must be downloaded
     required: false
     type: string
+  max_concurrency:
+    description:
+      Maximum number of files downloaded at the same time
+    required: false
+    type: int
+    default: 8
+  chunk_size:
+    description:
+      - Size in bytes of each chunk read from the File Share and written to disk
+      - Files are streamed to disk, memory used per download does not grow with the file size
+    required: false
+    type: int
+    default: 4194304
+  range_threshold:
+    description:
+      - Size in bytes from which a file is downloaded as concurrent byte ranges of chunk_size
+      - The local file is preallocated and each range is written at its offset, up to max_concurrency ranges at the same time
+    required: false
+    type: int
+    default: 268435456
+  resume:
+    description:
+      - Resume ranged downloads left unfinished by a previous run
+      - A journal file <local file>.o4n-journal records the ranges already written and is removed once the download completes
+      - Ranges are journaled in batches after the local file is flushed to disk, a rerun fetches only ranges not journaled
+      - A download completes when every range is journaled or fetched and the remote size and ETag did not change meanwhile
+    required: false
+    type: bool
+    default: true
+  sync:
+    description:
+      - Download only files that are new or changed
+      - A local file is unchanged when its size and modification time match the remote size and last modified time
+      - Downloaded files always get the remote last modified time as local modification time
+      - Unchanged files are returned in skipped
+    required: false
+    type: bool
+    default: false
 """
 
 RETURN = """
 output:
-  description: List of files downloaded
+  description: List of files downloaded and one result per file
   type: dict
   returned: allways
   sample: 
@@ -72,13 +115,25 @@ output:
       "changed": false,
       "content": [
           "o4n_azure_delete_files.py",
-          "o4n_azure_download_files.py",
-          "o4n_azure_manage_directory.py",
-          "o4n_azure_manage_shares.py",
-          "o4n_azure_upload_files.py"
+          "o4n_azure_download_files.py"
       ],
       "failed": false,
-      "msg": "Files downloaded to Directory </download_files> from share <share-to-test2>"
+      "msg": "Files downloaded to Directory </download_files> from share <share-to-test2>",
+      "skipped": [],
+      "results": [
+          {
+              "action": "downloaded",
+              "msg": "File <o4n_azure_delete_files.py> downloaded to </download_files/o4n_azure_delete_files.py>",
+              "name": "o4n_azure_delete_files.py",
+              "status": true
+          },
+          {
+              "action": "downloaded",
+              "msg": "File <o4n_azure_download_files.py> downloaded to </download_files/o4n_azure_download_files.py>",
+              "name": "o4n_azure_download_files.py",
+              "status": true
+          }
+      ]
     }
 """
 
@@ -112,6 +167,28 @@ tasks:
       local_path: /files
     register: output
 
+  - name: Download many files, 16 at the same time
+    o4n_azure_download_files:
+      account_name: "{{ connection_string }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      source_path: /reports
+      files: "*.csv"
+      local_path: /files
+      max_concurrency: 16
+    register: output
+
+  - name: Download only new or changed files
+    o4n_azure_download_files:
+      account_name: "{{ connection_string }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      source_path: /dir1
+      files: "*.*"
+      local_path: /files
+      sync: true
+    register: output
+
   - name: Download files
     o4n_azure_download_files:
       account_name: "{{ connection_string }}"
@@ -121,58 +198,244 @@ tasks:
     register: output
 """
 
-from azure.storage.fileshare import ShareClient
+import os
+import json
+import threading
+import time
+from datetime import datetime
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_shares import list_shares_in_service
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_share_exists import share_exists
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import configure_clients, get_share_client
 from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_files import list_files_in_share
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_select_files_pattern import select_files
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_select_files_pattern import select_files_multi, pattern_prefix
 from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_get_right_path import right_path
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_thread_pool import run_in_pool
 
+# Journal commits, one fsync of the local file every JOURNAL_BATCH_RANGES ranges or JOURNAL_BATCH_SECONDS seconds
+JOURNAL_BATCH_RANGES = 32
+JOURNAL_BATCH_SECONDS = 5
 
-def download_files(_account_name, _connection_string, _share, _source_path, _files, _local_path):
+
+def download_file(_share_client, _source_file, _local_file, _file_name):
+    try:
+        file=_share_client.get_file_client(_source_file)
+        # Download the file, streaming it to disk one chunk at a time
+        with open(_local_file, "wb") as data:
+            stream = file.download_file()
+            for chunk in stream.chunks():
+                data.write(chunk)
+        status = True
+        action = "downloaded"
+        msg_ret = f"File <{_file_name}> downloaded to <{_local_file}>"
+    except Exception as error:
+        status = False
+        action = "none"
+        msg_ret = f"File <{_file_name}> not downloaded to <{_local_file}>. Error: <{error}>"
+
+    return {"name": _file_name, "status": status, "action": action, "msg": msg_ret}
+
+
+def download_range(_file_client, _fd, _offset, _length):
+    stream = _file_client.download_file(offset=_offset, length=_length)
+    position = _offset
+    for chunk in stream.chunks():
+        os.pwrite(_fd, chunk, position)
+        position += len(chunk)
+
+    return position - _offset
+
+
+def read_journal(_journal_file, _header):
+    # Return the offsets already written by a previous run, only when the journal belongs to the same remote file
+    done = set()
+    if not os.path.isfile(_journal_file):
+        return done
+    try:
+        with open(_journal_file, "r") as journal:
+            lines = journal.read().splitlines()
+        header = json.loads(lines[0]) if len(lines) > 0 else None
+    except ValueError:
+        # a torn header means no range was journaled
+        return done
+    if header != _header:
+        return done
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+            done.add(entry['offset'])
+        except ValueError:
+            # a run killed while writing leaves a partial last line
+            break
+
+    return done
+
+
+def download_file_ranges(_share_client, _source_file, _local_file, _file_name, _size, _chunk_size, _max_concurrency, _resume):
+    try:
+        file=_share_client.get_file_client(_source_file)
+        ranges = [(offset, min(_chunk_size, _size - offset)) for offset in range(0, _size, _chunk_size)]
+        journal_file = _local_file + ".o4n-journal"
+        header = {"size": _size, "chunk_size": _chunk_size, "etag": file.get_file_properties().etag}
+        done = set()
+        if _resume and os.path.isfile(_local_file) and os.path.getsize(_local_file) == _size:
+            done = read_journal(journal_file, header)
+        pending = [byte_range for byte_range in ranges if byte_range[0] not in done]
+        fetched = set()
+        journal_lock = threading.Lock()
+        # Preallocate the local file, then fetch byte ranges concurrently and write each one at its offset
+        with open(_local_file, "r+b" if len(done) > 0 else "wb") as data, \
+             open(journal_file, "a" if len(done) > 0 else "w") as journal:
+            if len(done) == 0:
+                if hasattr(os, "posix_fallocate") and _size > 0:
+                    os.posix_fallocate(data.fileno(), 0, _size)
+                else:
+                    data.truncate(_size)
+                journal.write(json.dumps(header) + "\n")
+                journal.flush()
+
+            written_ranges = []
+            last_commit = [time.time()]
+
+            def commit_ranges():
+                # Record ranges only once their bytes are on disk, one fsync for the whole batch
+                if len(written_ranges) == 0:
+                    return
+                os.fsync(data.fileno())
+                for offset, length in written_ranges:
+                    journal.write(json.dumps({"offset": offset, "length": length}) + "\n")
+                    fetched.add(offset)
+                journal.flush()
+                written_ranges.clear()
+                last_commit[0] = time.time()
+
+            def fetch_range(byte_range):
+                written = download_range(file, data.fileno(), byte_range[0], byte_range[1])
+                if written != byte_range[1]:
+                    raise IOError(f"Range at offset <{byte_range[0]}> returned <{written}> of <{byte_range[1]}> bytes")
+                with journal_lock:
+                    written_ranges.append(byte_range)
+                    if len(written_ranges) >= JOURNAL_BATCH_RANGES or time.time() - last_commit[0] >= JOURNAL_BATCH_SECONDS:
+                        commit_ranges()
+
+            try:
+                run_in_pool(fetch_range, pending, _max_concurrency)
+            finally:
+                # Ranges written before a failure are kept for the next run
+                with journal_lock:
+                    commit_ranges()
+        # The local file is preallocated, completeness is every range journaled and the remote file unchanged meanwhile
+        missing = [offset for offset, length in ranges if offset not in done and offset not in fetched]
+        properties = file.get_file_properties()
+        if len(missing) > 0:
+            status = False
+            action = "none"
+            msg_ret = f"File <{_file_name}> not downloaded to <{_local_file}>. <{len(missing)}> of <{len(ranges)}> ranges missing"
+        elif properties.size != _size or properties.etag != header['etag']:
+            os.remove(journal_file)
+            status = False
+            action = "none"
+            msg_ret = f"File <{_file_name}> not downloaded to <{_local_file}>. Remote file changed during download, size <{properties.size}> etag <{properties.etag}>"
+        else:
+            os.remove(journal_file)
+            status = True
+            action = "downloaded"
+            msg_ret = f"File <{_file_name}> downloaded to <{_local_file}>, <{len(pending)}> of <{len(ranges)}> ranges fetched"
+    except Exception as error:
+        status = False
+        action = "none"
+        msg_ret = f"File <{_file_name}> not downloaded to <{_local_file}>. Error: <{error}>"
+
+    return {"name": _file_name, "status": status, "action": action, "msg": msg_ret}
+
+
+def is_unchanged(_local_file, _remote_file):
+    # A local file is unchanged when a previous run left it complete, with the remote size and last modified time
+    if not os.path.isfile(_local_file) or os.path.isfile(_local_file + ".o4n-journal"):
+        return False
+    if not _remote_file['last_modified'] or os.path.getsize(_local_file) != _remote_file['size']:
+        return False
+    remote_mtime = datetime.fromisoformat(_remote_file['last_modified']).timestamp()
+
+    return int(os.path.getmtime(_local_file)) == int(remote_mtime)
+
+
+def download_files(_account_name, _connection_string, _share, _source_path, _files, _local_path, _max_concurrency, _chunk_size,
+                   _range_threshold, _resume, _sync, _exclude):
     found_files=[]
+    skipped_files=[]
+    results=[]
     # casting some vars
     _source_path = right_path(_source_path)
     # check if share and path exist in Account Storage
     try:
-        status, msg_ret, output=list_shares_in_service(_account_name, _connection_string)
+        status, msg_ret, share_found=share_exists(_account_name, _connection_string, _share)
         if status:
-            share_exist=[share for share in output if share == _share]
-            if len(share_exist) != 1:
+            if not share_found:
                 status=False
                 msg_ret=f"Invalid File Share name: <{_share}>. Does not exist in Account Storage <{_account_name}>"
-                return (status, msg_ret, found_files)
+                return (status, msg_ret, found_files, skipped_files, results)
+        else:
+            return (status, msg_ret, found_files, skipped_files, results)
     except Exception as error:
         status=False
-        msg_ret=f"Invalid File Share name: <{_share}>. Listing Shares process failed"
-        return (status, msg_ret, found_files)
+        msg_ret=f"Invalid File Share name: <{_share}>. Checking Share process failed"
+        return (status, msg_ret, found_files, skipped_files, results)
     # Download files
     try:
-        # Instantiate the ShareFileClient from a connection string
-        share=ShareClient.from_connection_string(_connection_string, _share)
-        status, msg_ret_pattern, files_in_share=list_files_in_share(_account_name, _connection_string, _share, _source_path)
+        share=get_share_client(_connection_string, _share)
+        status, msg_ret_pattern, files_in_share=list_files_in_share(_account_name, _connection_string, _share, _source_path,
+                                                                    _name_prefix=pattern_prefix(_files))
         if status:
-            status, msg_ret, found_files=select_files(_files,
+            status, msg_ret, found_files=select_files_multi(_files, _exclude,
                                         [file['name'] for file in files_in_share if file])
+            if not status:
+                return status, msg_ret, found_files, skipped_files, results
             l_path=_local_path + "/" if _local_path else ""
             s_path=_source_path + "/" if _source_path else ""
-            if len(found_files) > 1:
-                for file_name in found_files:
-                    file=share.get_file_client(s_path + file_name)
-                    # Download the file
-                    with open(l_path + file_name, "wb") as data:
-                        stream = file.download_file()
-                        data.write(stream.readall())
-                status=True
-                msg_ret = f"Files downloaded to Directory <{_local_path}> from path <{_source_path}> in share <{_share}>"
-            elif len(found_files) == 1:
-                file=share.get_file_client(s_path + found_files[0])
-                # Download the file
-                with open(l_path + found_files[0], "wb") as data:
-                    stream = file.download_file()
-                    data.write(stream.readall())
+            remote_files = {file['name']: file for file in files_in_share if file}
+            if _sync:
+                # Only new or changed files are downloaded
+                skipped_files = [file_name for file_name in found_files if is_unchanged(l_path + file_name, remote_files[file_name])]
+                skipped_names = set(skipped_files)
+                found_files = [file_name for file_name in found_files if file_name not in skipped_names]
+            if len(found_files) == 0 and len(skipped_files) > 0:
                 status = True
-                msg_ret = f"File downloaded to Directory <{_local_path}> from path <{_source_path}> in share <{_share}>. File pattern <{_files}>"
+                results = [{"name": file_name, "status": True, "action": "skipped",
+                            "msg": f"File <{file_name}> unchanged in <{l_path + file_name}>"} for file_name in skipped_files]
+                msg_ret = f"Files in Directory <{_local_path}> up to date with path <{_source_path}> in share <{_share}>. File pattern <{_files}>"
+            elif len(found_files) > 0:
+                # Small files are downloaded concurrently, large files one at a time split in concurrent ranges
+                sizes = {file_name: remote_file['size'] for file_name, remote_file in remote_files.items()}
+                large_files = [file_name for file_name in found_files if sizes.get(file_name, 0) >= _range_threshold]
+                large_names = set(large_files)
+                small_files = [file_name for file_name in found_files if file_name not in large_names]
+                results_by_file = {}
+                for result in run_in_pool(lambda file_name: download_file(share, s_path + file_name, l_path + file_name, file_name),
+                                          small_files, _max_concurrency):
+                    results_by_file[result['name']] = result
+                for file_name in large_files:
+                    results_by_file[file_name] = download_file_ranges(share, s_path + file_name, l_path + file_name, file_name,
+                                                                      sizes[file_name], _chunk_size, _max_concurrency, _resume)
+                results = [results_by_file[file_name] for file_name in found_files]
+                # Keep the remote last modified time on local copies, sync relies on it
+                for result in results:
+                    last_modified = remote_files[result['name']]['last_modified']
+                    if result['status'] and last_modified:
+                        remote_mtime = datetime.fromisoformat(last_modified).timestamp()
+                        os.utime(l_path + result['name'], (remote_mtime, remote_mtime))
+                results = results + [{"name": file_name, "status": True, "action": "skipped",
+                                      "msg": f"File <{file_name}> unchanged in <{l_path + file_name}>"} for file_name in skipped_files]
+                failed = [result['name'] for result in results if not result['status']]
+                found_files = [result['name'] for result in results if result['status'] and result['action'] != "skipped"]
+                if len(failed) > 0:
+                    status = False
+                    msg_ret = f"Files not downloaded to Directory <{_local_path}> from path <{_source_path}> in share <{_share}>. <{len(failed)}> of <{len(results)}> downloads failed, File pattern <{_files}>"
+                elif len(found_files) > 1:
+                    status = True
+                    msg_ret = f"Files downloaded to Directory <{_local_path}> from path <{_source_path}> in share <{_share}>"
+                else:
+                    status = True
+                    msg_ret = f"File downloaded to Directory <{_local_path}> from path <{_source_path}> in share <{_share}>. File pattern <{_files}>"
             else:
                 status = False
                 msg_ret = f"Files not downloaded to Directory <{_local_path}> from path <{_source_path}> in share <{_share}>. No file to download, File pattern <{_files}>"
@@ -183,7 +446,7 @@ def download_files(_account_name, _connection_string, _share, _source_path, _fil
         msg_ret = f"Files not downloaded to Directory <{_local_path}>. File pattern <{_files}>. Error: <{error}>"
         status = False
 
-    return status, msg_ret, found_files
+    return status, msg_ret, found_files, skipped_files, results
 
 
 def main():
@@ -193,9 +456,17 @@ def main():
             share=dict(required=True, type='str'),
             connection_string=dict(required=True, type='str'),
             source_path=dict(required=False, type='str', default=''),
-            files=dict(required=True, type='str'),
-            local_path=dict(required=False, type='str', default='')
-        )
+            files=dict(required=False, type='str'),
+            include=dict(required=False, type='list', elements='str'),
+            exclude=dict(required=False, type='list', elements='str', default=[]),
+            local_path=dict(required=False, type='str', default=''),
+            max_concurrency=dict(required=False, type='int', default=8),
+            chunk_size=dict(required=False, type='int', default=4194304),
+            range_threshold=dict(required=False, type='int', default=268435456),
+            resume=dict(required=False, type='bool', default=True),
+            sync=dict(required=False, type='bool', default=False)
+        ),
+        required_one_of=[['files', 'include']]
     )
 
     account_name = module.params.get("account_name")
@@ -203,14 +474,30 @@ def main():
     connection_string = module.params.get("connection_string")
     source_path = module.params.get("source_path")
     files = module.params.get("files")
+    include = module.params.get("include")
+    exclude = module.params.get("exclude")
+    patterns = ([files] if files else []) + (include or [])
     local_path = module.params.get("local_path")
+    max_concurrency = module.params.get("max_concurrency")
+    chunk_size = module.params.get("chunk_size")
+    range_threshold = module.params.get("range_threshold")
+    resume = module.params.get("resume")
+    sync = module.params.get("sync")
+
+    if chunk_size <= 0:
+        module.fail_json(failed=True, msg=f"Invalid chunk_size <{chunk_size}>. Must be greater than 0", content=[])
+
+    # One pooled transport for every client, sized to the transfer concurrency. Chunk size bounds memory used per download
+    configure_clients(max_concurrency, max_single_get_size=chunk_size, max_chunk_get_size=chunk_size)
 
-    success, msg_ret, output=download_files(account_name, connection_string, share, source_path, files, local_path)
+    success, msg_ret, output, skipped, results=download_files(account_name, connection_string, share, source_path, patterns, local_path,
+                                                              max_concurrency, chunk_size, range_threshold, resume, sync,
+                                                              exclude)
 
     if success:
-        module.exit_json(failed=False, msg=msg_ret, content=output)
+        module.exit_json(failed=False, msg=msg_ret, content=output, skipped=skipped, results=results)
     else:
-        module.fail_json(failed=True, msg=msg_ret, content=output)
+        module.fail_json(failed=True, msg=msg_ret, content=output, skipped=skipped, results=results)
 
 
 if __name__ == "__main__":
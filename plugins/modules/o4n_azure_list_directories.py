@@ -41,6 +41,31 @@ options:
       path, directory, whose directories must be listed. If not present, path is the root of the File Share
     required: false
     type: string
+  recursive:
+    description:
+      - List directories of the whole tree under path, names are returned relative to path
+      - Directories are walked breadth first, up to max_concurrency directory listings at the same time
+    required: false
+    type: bool
+    default: false
+  max_concurrency:
+    description:
+      Maximum number of directory listings in flight when recursive is true
+    required: false
+    type: int
+    default: 8
+  max_results:
+    description:
+      - Return one page of up to max_results entries instead of the whole listing, only directories of the page are returned
+      - next_marker in the result continues the listing, it is empty when the listing is done
+      - Not supported together with recursive
+    required: false
+    type: int
+  continuation_token:
+    description:
+      next_marker returned by a previous paged call
+    required: false
+    type: string
 """
 
 RETURN = """
@@ -84,13 +109,22 @@ tasks:
       connection_string: "{{ connection_string }}"
       share: "{{ share }}"
     register: output
+
+  - name: List directories of the whole tree
+    o4n_azure_list_directories:
+      account_name: "{{ account_name }}"
+      connection_string: "{{ connection_string }}"
+      share: "{{ share }}"
+      recursive: true
+      max_concurrency: 32
+    register: output
 """
 
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_shares import list_shares_in_service
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_directories import list_directories_in_share
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_directories import list_directories_in_share, list_directories_page_in_share
 from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_get_right_path import right_path
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import configure_clients
 
 
 def main():
@@ -99,7 +133,11 @@ def main():
             account_name=dict(required=True, type='str'),
             share=dict(required=True, type='str'),
             connection_string=dict(required=True, type='str'),
-            path=dict(required=False, type='str'),
+            path=dict(required=False, type='str', default=''),
+            recursive=dict(required=False, type='bool', default=False),
+            max_concurrency=dict(required=False, type='int', default=8),
+            max_results=dict(required=False, type='int'),
+            continuation_token=dict(required=False, type='str', no_log=False),
         )
     )
 
@@ -107,12 +145,26 @@ def main():
     connection_string = module.params.get("connection_string")
     account_name = module.params.get("account_name")
     path = module.params.get("path")
+    recursive = module.params.get("recursive")
+    max_concurrency = module.params.get("max_concurrency")
+    max_results = module.params.get("max_results")
+    continuation_token = module.params.get("continuation_token")
     path_sub = right_path(path)
 
-    success, msg_ret, output = list_directories_in_share(account_name, connection_string, share, path_sub)
+    if max_results is not None and (recursive or max_results <= 0):
+        module.fail_json(failed=True, msg=f"Invalid max_results <{max_results}>. Must be greater than 0 and recursive must be false", content=[])
+
+    configure_clients(max_concurrency)
+    if max_results is not None:
+        # Only one page is kept in memory, next_marker lets the next task continue the listing
+        success, msg_ret, output, next_marker = list_directories_page_in_share(account_name, connection_string, share, path_sub,
+                                                                               max_results, continuation_token)
+    else:
+        success, msg_ret, output = list_directories_in_share(account_name, connection_string, share, path_sub, recursive, max_concurrency)
+        next_marker = ""
 
     if success:
-        module.exit_json(failed=False, msg=msg_ret, content=output)
+        module.exit_json(failed=False, msg=msg_ret, content=output, next_marker=next_marker)
     else:
         module.fail_json(failed=True, msg=msg_ret, content=output)
 
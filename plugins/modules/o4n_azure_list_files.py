@@ -41,11 +41,42 @@ options:
       path, directory, whose files must be listed
     required: false
     type: string
+  recursive:
+    description:
+      - List files of the whole tree under path, names are returned relative to path
+      - Directories are walked breadth first, up to max_concurrency directory listings at the same time
+    required: false
+    type: bool
+    default: false
+  max_concurrency:
+    description:
+      Maximum number of directory listings in flight when recursive is true
+    required: false
+    type: int
+    default: 8
+  max_results:
+    description:
+      - Return one page of up to max_results entries instead of the whole listing, only files of the page are returned
+      - next_marker in the result continues the listing, it is empty when the listing is done
+      - Not supported together with recursive
+    required: false
+    type: int
+  continuation_token:
+    description:
+      next_marker returned by a previous paged call
+    required: false
+    type: string
+  output_file:
+    description:
+      - Local JSON Lines file where files are written one per line as listing pages arrive
+      - When present content holds only the file path and summary counts. Not supported together with max_results
+    required: false
+    type: string
 """
 
 RETURN = """
 output:
-  description: List of files
+  description: List of files with size, timestamps, ETag and attributes returned by the listing call
   type: dict
   returned: allways
   sample: 
@@ -53,40 +84,32 @@ output:
       "changed": false,
       "content": [
           {
+              "change_time": "2023-05-10T14:02:31.532718+00:00",
+              "creation_time": "2023-05-10T14:02:31.532718+00:00",
+              "etag": "\"0x8DB5162A5E4C3AE\"",
+              "file_attributes": "Archive",
               "file_id": "9799948237879115776",
               "is_directory": false,
+              "last_access_time": "2023-05-10T14:02:31.532718+00:00",
+              "last_modified": "2023-05-10T14:02:31+00:00",
+              "last_write_time": "2023-05-10T14:02:31.532718+00:00",
               "name": "o4n_azure_delete_files.py",
+              "permission_key": "4066528134148476695*1",
               "size": 12240
           },
           {
+              "change_time": "2023-05-10T14:02:32.012345+00:00",
+              "creation_time": "2023-05-10T14:02:32.012345+00:00",
+              "etag": "\"0x8DB5162A62E1F09\"",
+              "file_attributes": "Archive",
               "file_id": "16141016513216774144",
               "is_directory": false,
+              "last_access_time": "2023-05-10T14:02:32.012345+00:00",
+              "last_modified": "2023-05-10T14:02:32+00:00",
+              "last_write_time": "2023-05-10T14:02:32.012345+00:00",
               "name": "o4n_azure_download_files.py",
+              "permission_key": "4066528134148476695*1",
               "size": 13353
-          },
-          {
-              "file_id": "12682251999396233216",
-              "is_directory": false,
-              "name": "o4n_azure_manage_directory.py",
-              "size": 9937
-          },
-          {
-              "file_id": "10376408990182539264",
-              "is_directory": false,
-              "name": "o4n_azure_manage_shares.py",
-              "size": 4359
-          },
-          {
-              "file_id": "17293938017823621120",
-              "is_directory": false,
-              "name": "o4n_azure_upload_files.py",
-              "size": 10611
-          },
-          {
-              "file_id": "14988095008609927168",
-              "is_directory": false,
-              "name": "__init__.py",
-              "size": 0
           }
       ],
       "failed": false,
@@ -103,11 +126,52 @@ tasks:
       share: "{{ share }}"
       path = /dir1/dir2
     register: output
+
+  - name: List files of the whole tree
+    o4n_azure_list_files:
+      account_name: "{{ account_name }}"
+      connection_string: "{{ connection_string }}"
+      share: "{{ share }}"
+      path: /dir1
+      recursive: true
+      max_concurrency: 32
+    register: output
+
+  - name: List the first 5000 entries of a large directory
+    o4n_azure_list_files:
+      account_name: "{{ account_name }}"
+      connection_string: "{{ connection_string }}"
+      share: "{{ share }}"
+      path: /dir1
+      max_results: 5000
+    register: page
+
+  - name: List the next 5000 entries
+    o4n_azure_list_files:
+      account_name: "{{ account_name }}"
+      connection_string: "{{ connection_string }}"
+      share: "{{ share }}"
+      path: /dir1
+      max_results: 5000
+      continuation_token: "{{ page.next_marker }}"
+    register: output
+    when: page.next_marker | length > 0
+
+  - name: Write the files of a huge tree to a local JSON Lines file
+    o4n_azure_list_files:
+      account_name: "{{ account_name }}"
+      connection_string: "{{ connection_string }}"
+      share: "{{ share }}"
+      path: /dir1
+      recursive: true
+      output_file: /tmp/dir1_files.jsonl
+    register: output
 """
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_files import list_files_in_share
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_files import list_files_in_share, list_files_page_in_share, stream_files_in_share
 from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_get_right_path import right_path
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import configure_clients
 
 
 def main():
@@ -117,6 +181,11 @@ def main():
       share=dict(required=True, type='str'),
       connection_string=dict(required=True, type='str'),
       path=dict(required=False, type='str', default=''),
+      recursive=dict(required=False, type='bool', default=False),
+      max_concurrency=dict(required=False, type='int', default=8),
+      max_results=dict(required=False, type='int'),
+      continuation_token=dict(required=False, type='str', no_log=False),
+      output_file=dict(required=False, type='str'),
     )
   )
 
@@ -124,12 +193,35 @@ def main():
   connection_string = module.params.get("connection_string")
   account_name = module.params.get("account_name")
   path = module.params.get("path")
+  recursive = module.params.get("recursive")
+  max_concurrency = module.params.get("max_concurrency")
+  max_results = module.params.get("max_results")
+  continuation_token = module.params.get("continuation_token")
+  output_file = module.params.get("output_file")
   path_sub = right_path(path)
 
-  success, msg_ret, output = list_files_in_share(account_name, connection_string, share, path_sub)
+  if max_results is not None and (recursive or max_results <= 0):
+      module.fail_json(failed=True, msg=f"Invalid max_results <{max_results}>. Must be greater than 0 and recursive must be false", content=[])
+
+  if max_results is not None and output_file:
+      module.fail_json(failed=True, msg="output_file and max_results are mutually exclusive", content=[])
+
+  configure_clients(max_concurrency)
+  if output_file:
+      # Entries go to the local file, the module result only carries summary counts
+      success, msg_ret, output = stream_files_in_share(account_name, connection_string, share, path_sub, output_file, recursive,
+                                                       max_concurrency)
+      next_marker = ""
+  elif max_results is not None:
+      # Only one page is kept in memory, next_marker lets the next task continue the listing
+      success, msg_ret, output, next_marker = list_files_page_in_share(account_name, connection_string, share, path_sub, max_results,
+                                                                       continuation_token)
+  else:
+      success, msg_ret, output = list_files_in_share(account_name, connection_string, share, path_sub, recursive, max_concurrency)
+      next_marker = ""
 
   if success:
-      module.exit_json(failed=False, msg=msg_ret, content=output)
+      module.exit_json(failed=False, msg=msg_ret, content=output, next_marker=next_marker)
   else:
       module.fail_json(failed=False, msg=msg_ret, content=output)
 
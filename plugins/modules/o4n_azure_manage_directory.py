@@ -57,6 +57,40 @@ options:
       parent path, directory, where directory must be created or deleted
     required: false
     type: string
+  recursive:
+    description:
+      - With state absent, delete the Directory with everything under it
+      - The tree is walked concurrently, files are deleted in parallel and directories bottom-up one depth level at a time
+    required: false
+    type: bool
+    default: false
+  parents:
+    description:
+      - With state present, create every missing ancestor of the Directory, like mkdir -p
+      - A Directory that already exists is not an error
+    required: false
+    type: bool
+    default: false
+  max_concurrency:
+    description:
+      Maximum number of listings, creates or deletes in flight when recursive is true or paths or manifest are present
+    required: false
+    type: int
+    default: 8
+  paths:
+    description:
+      - List of directories to create in one task, with state present. Relative to parent_path when it is present
+      - Directories are created one depth level at a time, up to max_concurrency at the same time
+      - With parents true missing ancestors are created too
+      - content holds one result per path, action is created, exists or failed
+    required: false
+    type: list
+    elements: str
+  manifest:
+    description:
+      Local file with one directory per line, added to paths. Empty lines and lines starting with # are ignored
+    required: false
+    type: string
 """
 
 RETURN = """
@@ -139,21 +173,62 @@ tasks:
       parent_path: /dir1
       state: absent
     register: output
+
+  - name: Create a deep Directory and its missing ancestors
+    o4n_azure_manage_directory:
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      path: /dir1/dir2/dir3/dir4
+      parents: true
+    register: output
+
+  - name: Create many Directories in one task
+    o4n_azure_manage_directory:
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      parent_path: /customers
+      paths:
+        - /customer-0001/in
+        - /customer-0001/out
+        - /customer-0002/in
+      parents: true
+      max_concurrency: 32
+    register: output
+
+  - name: Create the Directories listed in a manifest file
+    o4n_azure_manage_directory:
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      manifest: /tmp/directories.txt
+      parents: true
+    register: output
+
+  - name: Delete a populated Directory tree
+    o4n_azure_manage_directory:
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      path: /staging
+      state: absent
+      recursive: true
+      max_concurrency: 32
+    register: output
 """
 
 
-from azure.storage.fileshare import ShareClient
 import azure.core.exceptions as aze
 from ansible.module_utils.basic import AnsibleModule
 # from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_shares import list_shares_in_service
 # from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_directories import list_directories_in_share
 from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_get_right_path import right_path
-
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import configure_clients, get_share_client
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_walk_share import walk_share
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_thread_pool import run_in_pool
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_create_tree import create_directory_tree
 
 
 def create_directory(_connection_string, _share, _directory, _state):
     action = "none"
-    share = ShareClient.from_connection_string(_connection_string, _share)
+    share = get_share_client(_connection_string, _share)
     try:
         new_directory = share.get_directory_client(directory_path=_directory)
         if _state.lower() == "present":
@@ -178,7 +253,7 @@ def create_directory(_connection_string, _share, _directory, _state):
     return status, msg_ret, _directory
 
 def create_subdirectory(_connection_string, _share, _directory, _parent_directory, _state):
-    share = ShareClient.from_connection_string(_connection_string, _share)
+    share = get_share_client(_connection_string, _share)
     action = "none"
     try:
         parent_dir = share.get_directory_client(directory_path=_parent_directory)
@@ -203,6 +278,91 @@ def create_subdirectory(_connection_string, _share, _directory, _parent_director
     return status, msg_ret, "/" + _parent_directory + "/"+ _directory
 
 
+def create_directory_parents(_connection_string, _share, _directory):
+    share = get_share_client(_connection_string, _share)
+    try:
+        # Create every missing ancestor and the directory itself, like mkdir -p
+        results = create_directory_tree(share, [_directory], 1)
+        failed = [result for result in results.values() if not result['status']]
+        created = [result for result in results.values() if result['action'] == "created"]
+        if len(failed) > 0:
+            status = False
+            msg_ret = f"Directory <{_directory}> not <created> in share <{_share}>. {failed[0]['msg']}"
+        else:
+            status = True
+            msg_ret = f"Directory <{_directory}> <created> in share <{_share}>. <{len(created)}> missing directories created"
+    except Exception as error:
+        msg_ret = f"Error managing Directory <{_directory}> in share <{_share}>. Error: <{error}>"
+        status = False
+
+    return status, msg_ret, "/" + _directory
+
+
+def create_directories_bulk(_connection_string, _share, _directories, _parents, _max_concurrency):
+    share = get_share_client(_connection_string, _share)
+    results = {}
+    try:
+        results = create_directory_tree(share, _directories, _max_concurrency, _parents)
+        output = [results[directory] for directory in _directories]
+        failed = [result for result in output if not result['status']]
+        status = len(failed) == 0
+        if status:
+            msg_ret = f"<{len(output)}> Directories present in share <{_share}>. <{len([result for result in results.values() if result['action'] == 'created'])}> created"
+        else:
+            msg_ret = f"<{len(failed)}> of <{len(output)}> Directories not created in share <{_share}>"
+    except Exception as error:
+        output = [results.get(directory, {"name": directory, "status": False, "action": "failed", "msg": f"Directory <{directory}> not created"})
+                  for directory in _directories]
+        msg_ret = f"Error creating Directories in share <{_share}>. Error: <{error}>"
+        status = False
+
+    return status, msg_ret, output
+
+
+def read_directory_manifest(_manifest_file):
+    # One path per line, empty lines and lines starting with # are ignored
+    with open(_manifest_file, "r") as manifest:
+        return [line.strip() for line in manifest if line.strip() and not line.strip().startswith("#")]
+
+
+def delete_tree_item(_delete_function):
+    try:
+        _delete_function()
+    except aze.ResourceNotFoundError:
+        # Already gone, the end state is the requested one
+        pass
+
+    return True
+
+
+def delete_directory_tree(_connection_string, _share, _directory, _max_concurrency):
+    share = get_share_client(_connection_string, _share)
+    try:
+        # Walk the tree concurrently, then delete files in parallel and directories bottom-up one depth level at a time
+        tree = walk_share(share, _directory, _max_concurrency)
+        d_path = _directory + "/" if _directory else ""
+        files = [d_path + path for path, entry in tree if not entry['is_directory']]
+        levels = {}
+        for path, entry in tree:
+            if entry['is_directory']:
+                levels.setdefault(path.count("/"), []).append(d_path + path)
+        run_in_pool(lambda file_path: delete_tree_item(share.get_file_client(file_path).delete_file), files, _max_concurrency)
+        for depth in sorted(levels, reverse=True):
+            run_in_pool(lambda directory_path: delete_tree_item(share.get_directory_client(directory_path).delete_directory),
+                        levels[depth], _max_concurrency)
+        share.get_directory_client(directory_path=_directory).delete_directory()
+        status = True
+        msg_ret = f"Directory <{_directory}> <deleted> in share <{_share}> with <{len(files)}> files and <{sum(len(level) for level in levels.values())}> sub directories"
+    except aze.ResourceNotFoundError:
+        status = False
+        msg_ret = f"Directory <{_directory}> not <deleted> in share <{_share}>. The Directory does not exist>"
+    except Exception as error:
+        msg_ret = f"Error deleting Directory tree <{_directory}> in share <{_share}>. Error: <{error}>"
+        status = False
+
+    return status, msg_ret, "/" + _directory
+
+
 def main():
     module=AnsibleModule(
         argument_spec=dict(
@@ -211,6 +371,11 @@ def main():
             path = dict(required=False, type='str', default=''),
             parent_path = dict(required=False, type='str', default=''),
             state = dict(required=False, type='str', choices=["present", "absent"], default='present'),
+            recursive = dict(required=False, type='bool', default=False),
+            parents = dict(required=False, type='bool', default=False),
+            max_concurrency = dict(required=False, type='int', default=8),
+            paths = dict(required=False, type='list', elements='str', default=[]),
+            manifest = dict(required=False, type='str', default=''),
         )
     )
 
@@ -219,10 +384,36 @@ def main():
     path = module.params.get("path")
     parent_path = module.params.get("parent_path")
     state = module.params.get("state")
+    recursive = module.params.get("recursive")
+    parents = module.params.get("parents")
+    max_concurrency = module.params.get("max_concurrency")
+    paths = module.params.get("paths")
+    manifest = module.params.get("manifest")
     path_sub = right_path(path)
     parent_path_sub = right_path(parent_path)
 
-    if not parent_path_sub:
+    configure_clients(max_concurrency)
+    directory = parent_path_sub + "/" + path_sub if parent_path_sub else path_sub
+    if paths or manifest:
+        if state != "present":
+            module.fail_json(failed=True, msg="paths and manifest are supported with state present only", content=[])
+        try:
+            bulk_paths = paths + (read_directory_manifest(manifest) if manifest else [])
+        except Exception as error:
+            module.fail_json(failed=True, msg=f"Manifest <{manifest}> not read. Error: <{error}>", content=[])
+        # Paths are relative to parent_path when it is present, duplicates are created once
+        bulk_paths = [right_path(parent_path_sub + "/" + right_path(bulk_path) if parent_path_sub else bulk_path) for bulk_path in bulk_paths]
+        bulk_paths = [bulk_path for bulk_path in dict.fromkeys(bulk_paths) if bulk_path]
+        success, msg_ret, output = create_directories_bulk(connection_string, share, bulk_paths, parents,
+                                                           max_concurrency)
+    elif recursive and state == "absent":
+        if not directory:
+            # An empty path resolves to the share root, never delete a whole share as a directory tree
+            module.fail_json(failed=True, msg="path is required with state absent and recursive", content=[])
+        success, msg_ret, output = delete_directory_tree(connection_string, share, directory, max_concurrency)
+    elif parents and state == "present":
+        success, msg_ret, output = create_directory_parents(connection_string, share, directory)
+    elif not parent_path_sub:
         success, msg_ret, output = create_directory(connection_string, share, path_sub, state)
     else:
         success, msg_ret, output = create_subdirectory(connection_string, share, path_sub, parent_path_sub, state)
@@ -31,9 +31,28 @@ options:
     default: present
   share:
     description:
-      Name of the share to be managed
-    required: true
+      Name of the share to be managed. Required when shares is not present
+    required: false
     type: string
+  quota:
+    description:
+      Quota of the share in GiB. Applied on creation, or on an existing share when state is present
+    required: false
+    type: int
+  shares:
+    description:
+      - List of shares managed in one task, each one with name, state (default present) and quota
+      - Shares are created or deleted at the same time, content holds one result per share
+      - Mutually exclusive with share and quota, state applies to share only
+    required: false
+    type: list
+    elements: dict
+  max_concurrency:
+    description:
+      Maximum number of shares managed at the same time
+    required: false
+    type: int
+    default: 8
   connection_string:
     description:
       String that include URL & Token to connect to Azure Storage Account. Provided by Azure Portal
@@ -56,6 +75,7 @@ output:
     output: {
       "changed": false,
       "content": {
+          "action": "created",
           "share": "share-to-test"
       },
       "failed": false,
@@ -79,28 +99,45 @@ tasks:
       share: share-to-test
       connection_string: "{{ connection_string }}"
     register: output
+
+  - name: Provision the shares of a tenant
+    o4n_azure_manage_share:
+      account_name: "{{ account_name }}"
+      connection_string: "{{ connection_string }}"
+      shares:
+        - name: tenant1-data
+          quota: 100
+        - name: tenant1-logs
+          quota: 10
+        - name: tenant1-old
+          state: absent
+      max_concurrency: 16
+    register: output
 """
 
 
-from azure.storage.fileshare import ShareClient
 from ansible.module_utils.basic import AnsibleModule
 import azure.core.exceptions as aze
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import configure_clients, get_share_client
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_thread_pool import run_in_pool
 
-def create_client_with_connection_string(_conn_string):
-        # Instantiate the ShareServiceClient from a connection string
-        from azure.storage.fileshare import ShareServiceClient
-        file_service = ShareServiceClient.from_connection_string(_conn_string)
-
-def manage_share(_share, _conn_string, _account_name, _state):
+def manage_share(_share, _conn_string, _account_name, _state, _quota=None):
     output = {"share": _share}
     action = "none"
     try:
-        # Instantiate the ShareClient from a connection string
-        share = ShareClient.from_connection_string(_conn_string, share_name=_share)
+        # Get the ShareClient for the connection string
+        share = get_share_client(_conn_string, _share)
         # Create or Delete the share
         if _state.lower() == "present":
-            share.create_share()
-            action = "created"
+            try:
+                share.create_share(quota=_quota)
+                action = "created"
+            except aze.ResourceExistsError:
+                if not _quota:
+                    raise
+                # Existing share, only its quota is applied
+                share.set_share_quota(_quota)
+                action = "updated"
         elif _state.lower() == "absent":
             share.delete_share()
             action = "deleted"
@@ -115,6 +152,26 @@ def manage_share(_share, _conn_string, _account_name, _state):
     except Exception as error:
         msg_ret = f"Error managing File Share <{_share}> in <{_account_name}>. Error: <{error}>"
         status = False
+    output['action'] = action
+
+    return status, msg_ret, output
+
+
+def manage_shares_bulk(_shares, _conn_string, _account_name, _max_concurrency):
+    # Every share is applied at the same time through clients of one service client, one result per share
+    def apply_share(_item):
+        status, msg_ret, output = manage_share(_item['name'], _conn_string, _account_name, _item.get('state') or "present",
+                                               _item.get('quota'))
+        output.update({"status": status, "msg": msg_ret})
+        return output
+
+    output = run_in_pool(apply_share, _shares, _max_concurrency)
+    failed = [result for result in output if not result['status']]
+    status = len(failed) == 0
+    if status:
+        msg_ret = f"<{len(output)}> File Shares managed in account <{_account_name}>"
+    else:
+        msg_ret = f"<{len(failed)}> of <{len(output)}> File Shares not managed in account <{_account_name}>"
 
     return status, msg_ret, output
 
@@ -124,18 +181,34 @@ def main():
         argument_spec=dict(
             account_name=dict(required=True, type='str'),
             state=dict(required=False, type='str', choices=["present", "absent"], default='present'),
-            share=dict(required=True, type='str'),
+            share=dict(required=False, type='str'),
+            quota=dict(required=False, type='int'),
+            shares=dict(required=False, type='list', elements='dict',
+                        options=dict(
+                            name=dict(required=True, type='str'),
+                            state=dict(required=False, type='str', choices=["present", "absent"], default='present'),
+                            quota=dict(required=False, type='int'),
+                        )),
+            max_concurrency=dict(required=False, type='int', default=8),
             connection_string=dict(required= True, type='str'),
-        )
+        ),
+        required_one_of=[['share', 'shares']],
+        mutually_exclusive=[['share', 'shares'], ['quota', 'shares']]
     )
 
     state = module.params.get("state")
     share = module.params.get("share")
     connection_string = module.params.get("connection_string")
     account_name = module.params.get("account_name")
+    quota = module.params.get("quota")
+    shares = module.params.get("shares")
+    max_concurrency = module.params.get("max_concurrency")
 
-    create_client_with_connection_string(connection_string)
-    success, msg_ret, output = manage_share(share,connection_string,account_name,state)
+    configure_clients(max_concurrency)
+    if shares is not None:
+        success, msg_ret, output = manage_shares_bulk(shares, connection_string, account_name, max_concurrency)
+    else:
+        success, msg_ret, output = manage_share(share,connection_string,account_name,state,quota)
     if success:
         module.exit_json(failed=False, msg=msg_ret, content=output)
     else:
@@ -33,19 +33,24 @@ options:
     type: string
   files:
     description:
-      files to deleted from File ShRE
-    required: true
-    choices:
-      - 'file*'
-      - 'file*.txt'
-      - 'file*.tx*'
-      - 'file*.*'
-      - file.tx*
-      - '*.txt'
-      - 'file.*'
-      - '*.*'
-      - 'file.txt'
+      - files to be uploaded to File Share
+      - Glob pattern, * any characters, ? one character, [abc] and [!abc] character classes, ** any characters including /
+      - '*.*' selects every file
+    required: false
     type: string
+  include:
+    description:
+      - List of file patterns to select, same syntax as files. Used together with files when both are present
+      - Every pattern is checked against a single listing
+    required: false
+    type: list
+    elements: str
+  exclude:
+    description:
+      List of file patterns to leave out of the selection
+    required: false
+    type: list
+    elements: str
   source_path:
     description:
       path, local directory where files to be uploaded are 
@@ -54,11 +59,62 @@ options:
       path, directory where files must be uploaded
     required: false
     type: string
+  max_concurrency:
+    description:
+      Maximum number of files uploaded at the same time
+    required: false
+    type: int
+    default: 8
+  chunk_size:
+    description:
+      - Size in bytes of each range uploaded for files bigger than range_threshold
+      - Azure Files accepts up to 4194304 bytes per range
+    required: false
+    type: int
+    default: 4194304
+  range_threshold:
+    description:
+      - Size in bytes from which a file is uploaded as concurrent ranges of chunk_size
+      - The remote file is created at its final size once, up to max_concurrency ranges are uploaded at the same time
+    required: false
+    type: int
+    default: 268435456
+  sync:
+    description:
+      - Upload only files that changed since their last upload to the same account, share and dest_path
+      - Path, size, mtime and sha256 of uploaded files are kept in a local manifest
+      - A file whose size and mtime match its manifest entry is skipped without reading it
+      - Unchanged files are returned in skipped
+    required: false
+    type: bool
+    default: false
+  manifest:
+    description:
+      - Local manifest file used by sync. Default is .o4n_upload_manifest.json in source_path
+      - The manifest and its .tmp file are left out of every upload, with or without sync
+    required: false
+    type: string
+  sparse:
+    description:
+      - Upload every file as ranges and never send all-zero ranges
+      - Local holes are found with SEEK_DATA/SEEK_HOLE, ranges of chunk_size holding only zeros are skipped
+      - Azure Files reads unwritten ranges as zeros, the remote content is the same as the local file
+    required: false
+    type: bool
+    default: false
+  recursive:
+    description:
+      - Upload matching files of the whole local tree under source_path, keeping their relative paths under dest_path
+      - Missing remote directories are created one depth level at a time, directories of a level at the same time
+      - Files are returned with their path relative to source_path
+    required: false
+    type: bool
+    default: false
 """
 
 RETURN = """
 output:
-  description: List of files uploaded
+  description: List of files uploaded and one result per file
   type: dict
   returned: allways
   sample: 
@@ -66,17 +122,25 @@ output:
         "changed": false,
         "content": [
             "o4n_azure_list_files.py",
-            "o4n_azure_list_shares.py",
-            "o4n_azure_download_files.py",
-            "o4n_azure_manage_shares.py",
-            "__init__.py",
-            "o4n_azure_manage_directory.py",
-            "o4n_azure_upload_files.py",
-            "o4n_azure_delete_files.py",
-            "o4n_azure_list_directories.py"
+            "o4n_azure_list_shares.py"
         ],
         "failed": false,
-        "msg": "Files uploaded to Directory </dir1> in share <share-to-test2>"
+        "msg": "Files uploaded to Directory </dir1> in share <share-to-test2>. Uploaded <2>, skipped <0>",
+        "skipped": [],
+        "results": [
+            {
+                "action": "uploaded",
+                "msg": "File <o4n_azure_list_files.py> uploaded to <dir1/o4n_azure_list_files.py>",
+                "name": "o4n_azure_list_files.py",
+                "status": true
+            },
+            {
+                "action": "uploaded",
+                "msg": "File <o4n_azure_list_shares.py> uploaded to <dir1/o4n_azure_list_shares.py>",
+                "name": "o4n_azure_list_shares.py",
+                "status": true
+            }
+        ]
     }
 """
 
@@ -117,45 +181,264 @@ tasks:
       connection_string: "{{ connection_string }}"
       files: file*.t*
       register: output
+
+  - name: Upload many files, 16 at the same time
+    o4n_azure_upload_files:
+      account_name: "{{ connection_string }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      source_path: /var/log/app
+      files: "*.log"
+      dest_path: /logs
+      max_concurrency: 16
+    register: output
+
+  - name: Upload only files changed since the last run
+    o4n_azure_upload_files:
+      account_name: "{{ connection_string }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      source_path: /var/log/app
+      files: "*.log"
+      dest_path: /logs
+      sync: true
+    register: output
+
+  - name: Upload a whole local tree
+    o4n_azure_upload_files:
+      account_name: "{{ connection_string }}"
+      share: share-to-test
+      connection_string: "{{ connection_string }}"
+      source_path: reports
+      files: "*.*"
+      dest_path: /reports
+      recursive: true
+    register: output
 """
 
 
 import os
-from azure.storage.fileshare import ShareClient
+import json
+import hashlib
+import errno
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_list_shares import list_shares_in_service
-from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_select_files_pattern import select_files
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_share_exists import share_exists
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_clients import configure_clients, get_share_client
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_select_files_pattern import select_files_multi
 from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_get_right_path import right_path
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_thread_pool import run_in_pool
+from ansible_collections.escrimaglia.o4n_azure_storagefile_test.plugins.module_utils.util_create_tree import create_directory_tree
+
+
+def upload_file(_share_client, _source_file, _dest_file, _file_name):
+  try:
+      file = _share_client.get_file_client(_dest_file)
+      # Upload file
+      with open(_source_file, "rb") as source_file:
+          file.upload_file(source_file)
+      status = True
+      action = "uploaded"
+      msg_ret = f"File <{_file_name}> uploaded to <{_dest_file}>"
+  except Exception as error:
+      status = False
+      action = "none"
+      msg_ret = f"File <{_file_name}> not uploaded to <{_dest_file}>. Error: <{error}>"
+
+  return {"name": _file_name, "status": status, "action": action, "msg": msg_ret}
+
+
+def upload_range(_file_client, _fd, _offset, _length, _sparse):
+  data = os.pread(_fd, _length, _offset)
+  if _sparse and data.count(0) == len(data):
+      # Unwritten ranges of a remote file already read as zeros
+      return 0
+  _file_client.upload_range(data, offset=_offset, length=len(data))
+
+  return len(data)
+
+
+def data_segments(_fd, _size):
+  # Return the (start, end) regions of a local file holding data, holes reported by SEEK_DATA/SEEK_HOLE are left out
+  if not hasattr(os, "SEEK_DATA"):
+      return [(0, _size)]
+  segments = []
+  offset = 0
+  while offset < _size:
+      try:
+          start = os.lseek(_fd, offset, os.SEEK_DATA)
+      except OSError as error:
+          if error.errno == errno.ENXIO:
+              # no data after offset, the rest of the file is a hole
+              break
+          return [(0, _size)]
+      end = min(os.lseek(_fd, start, os.SEEK_HOLE), _size)
+      segments.append((start, end))
+      offset = end
+
+  return segments
+
+
+def upload_file_ranges(_share_client, _source_file, _dest_file, _file_name, _size, _chunk_size, _max_concurrency, _sparse):
+  try:
+      file = _share_client.get_file_client(_dest_file)
+      # Create the remote file at its final size once, then upload ranges concurrently read straight from the local file
+      file.create_file(_size)
+      with open(_source_file, "rb") as source_file:
+          segments = data_segments(source_file.fileno(), _size) if _sparse else [(0, _size)]
+          ranges = [(offset, min(_chunk_size, end - offset)) for start, end in segments for offset in range(start, end, _chunk_size)]
+          sent = run_in_pool(lambda byte_range: upload_range(file, source_file.fileno(), byte_range[0], byte_range[1], _sparse),
+                             ranges, _max_concurrency)
+      status = True
+      action = "uploaded"
+      msg_ret = f"File <{_file_name}> uploaded to <{_dest_file}> in <{len([length for length in sent if length])}> ranges, <{sum(sent)}> of <{_size}> bytes sent"
+  except Exception as error:
+      status = False
+      action = "none"
+      msg_ret = f"File <{_file_name}> not uploaded to <{_dest_file}>. Error: <{error}>"
 
+  return {"name": _file_name, "status": status, "action": action, "msg": msg_ret}
 
-def upload_files(_account_name, _share, _connection_string, _source_path, _source_file, _dest_path):
+
+def file_hash(_source_file):
+  content_hash = hashlib.sha256()
+  with open(_source_file, "rb") as source_file:
+      for block in iter(lambda: source_file.read(1048576), b""):
+          content_hash.update(block)
+
+  return content_hash.hexdigest()
+
+
+def read_manifest(_manifest_file):
+  if not os.path.isfile(_manifest_file):
+      return {}
+  with open(_manifest_file, "r") as manifest:
+      return json.load(manifest)
+
+
+def write_manifest(_manifest_file, _manifest):
+  # Write to a temporary file first, an interrupted run never leaves a truncated manifest
+  with open(_manifest_file + ".tmp", "w") as manifest:
+      json.dump(_manifest, manifest, indent=1, sort_keys=True)
+  os.replace(_manifest_file + ".tmp", _manifest_file)
+
+
+def changed_entry(_source_file, _entry):
+  # Return the new manifest entry of a file, or None when the file did not change since its last upload
+  file_stat = os.stat(_source_file)
+  if _entry and _entry['size'] == file_stat.st_size and _entry['mtime'] == file_stat.st_mtime:
+      return None
+  entry = {"size": file_stat.st_size, "mtime": file_stat.st_mtime, "sha256": file_hash(_source_file)}
+  if _entry and _entry['size'] == entry['size'] and _entry['sha256'] == entry['sha256']:
+      # Only the modification time changed, refresh it and skip the upload
+      _entry['mtime'] = entry['mtime']
+      return None
+
+  return entry
+
+
+def select_tree_files(_search_dir, _source_file, _exclude):
+  # Walk the local tree, files matching the pattern are returned with their path relative to _search_dir
   found_files = []
+  for root, dirs, files in os.walk(_search_dir):
+      dirs.sort()
+      status, msg_ret, selected = select_files_multi(_source_file, _exclude, sorted(files))
+      if not status:
+          return status, msg_ret, []
+      rel_dir = os.path.relpath(root, _search_dir)
+      prefix = "" if rel_dir == "." else rel_dir.replace(os.sep, "/") + "/"
+      found_files += [prefix + file_name for file_name in selected]
+
+  return True, f"Files selection done for <{_source_file}> in tree <{_search_dir}>", found_files
+
+
+def upload_files(_account_name, _share, _connection_string, _source_path, _source_file, _dest_path, _max_concurrency,
+                 _chunk_size, _range_threshold, _sync, _manifest_file, _sparse, _recursive, _exclude):
+  found_files = []
+  skipped_files = []
+  results = []
   _dest_path = right_path(_dest_path)
   try:
       # get files form local file system
       base_dir = os.getcwd() + "/" + _source_path + "/"
       search_dir = os.path.dirname(base_dir)
-      files_in_dir = os.listdir(search_dir)
+      files_in_dir = os.listdir(search_dir) if not _recursive else []
       # Instantiate the ShareClient from a connection string
-      status, msg_ret, shares_in_service = list_shares_in_service(_account_name, _connection_string)
-      if status:
-        share_exist = [share_name for share_name in shares_in_service if share_name == _share]
-      if len(share_exist) == 1:
-        share = ShareClient.from_connection_string(_connection_string, _share)
-        status, msg_ret, found_files = select_files(_source_file, files_in_dir)
+      status, msg_ret, share_found = share_exists(_account_name, _connection_string, _share)
+      if not status:
+        return status, msg_ret, found_files, skipped_files, results
+      if share_found:
+        share = get_share_client(_connection_string, _share)
+        if _recursive:
+            status, msg_ret, found_files = select_tree_files(search_dir, _source_file, _exclude)
+        else:
+            status, msg_ret, found_files = select_files_multi(_source_file, _exclude, files_in_dir)
+        if not status:
+            return status, msg_ret, found_files, skipped_files, results
         source_path = _source_path + "/" if _source_path else ""
         dest_path = _dest_path + "/" if _dest_path else ""
-        if len(found_files) > 0:
-            for file_name in found_files:
-                file = share.get_file_client(dest_path + file_name)
-                # Upload files
-                with open(source_path + file_name, "rb") as source_file:
-                    file.upload_file(source_file)
+        # The sync manifest and its temporary file are never uploaded, whatever the mode of this run
+        manifest_file = _manifest_file if _manifest_file else source_path + ".o4n_upload_manifest.json"
+        manifest_names = {os.path.abspath(manifest_file), os.path.abspath(manifest_file + ".tmp")}
+        found_files = [file_name for file_name in found_files if os.path.abspath(source_path + file_name) not in manifest_names]
+        if _sync:
+            # Only files whose size, mtime and content hash changed since the last upload to this destination are uploaded
+            manifest = read_manifest(manifest_file)
+            destination = manifest.setdefault(f"{_account_name}/{_share}/{_dest_path}", {})
+            entries = run_in_pool(lambda file_name: changed_entry(source_path + file_name, destination.get(file_name)),
+                                  found_files, _max_concurrency)
+            new_entries = {file_name: entry for file_name, entry in zip(found_files, entries) if entry}
+            skipped_files = [file_name for file_name in found_files if file_name not in new_entries]
+            found_files = [file_name for file_name in found_files if file_name in new_entries]
+        if len(found_files) == 0 and len(skipped_files) > 0:
             status = True
-            msg_ret = f"Files uploaded to Directory <{_dest_path}> in share <{_share}>"
+            results = [{"name": file_name, "status": True, "action": "skipped",
+                        "msg": f"File <{file_name}> unchanged since last upload"} for file_name in skipped_files]
+            msg_ret = f"Files in Directory <{_dest_path}> in share <{_share}> up to date. Uploaded <0>, skipped <{len(skipped_files)}>"
+        elif len(found_files) > 0:
+            if _recursive:
+                # Remote directories of the selected files, missing ancestors under dest_path included
+                directories = create_directory_tree(share, sorted({file_name.rsplit("/", 1)[0] for file_name in found_files if "/" in file_name}),
+                                                    _max_concurrency, _root=dest_path)
+                failed_directories = [result['msg'] for result in directories.values() if not result['status']]
+                if len(failed_directories) > 0:
+                    raise IOError(failed_directories[0])
+            # Small files are uploaded concurrently, large files one at a time split in concurrent ranges
+            sizes = {file_name: os.path.getsize(source_path + file_name) for file_name in found_files}
+            large_files = [file_name for file_name in found_files if sizes[file_name] >= _range_threshold]
+            large_names = set(large_files)
+            small_files = [file_name for file_name in found_files if file_name not in large_names]
+            results_by_file = {}
+            if _sparse:
+                # Sparse files go through ranges too, the small ones with a single range worker each
+                small_upload = lambda file_name: upload_file_ranges(share, source_path + file_name, dest_path + file_name, file_name,
+                                                                    sizes[file_name], _chunk_size, 1, _sparse)
+            else:
+                small_upload = lambda file_name: upload_file(share, source_path + file_name, dest_path + file_name, file_name)
+            for result in run_in_pool(small_upload, small_files, _max_concurrency):
+                results_by_file[result['name']] = result
+            for file_name in large_files:
+                results_by_file[file_name] = upload_file_ranges(share, source_path + file_name, dest_path + file_name, file_name,
+                                                                sizes[file_name], _chunk_size, _max_concurrency, _sparse)
+            results = [results_by_file[file_name] for file_name in found_files]
+            failed = [result['name'] for result in results if not result['status']]
+            found_files = [result['name'] for result in results if result['status']]
+            if _sync:
+                # Failed files keep their old entry and are retried on the next run
+                for file_name in found_files:
+                    destination[file_name] = new_entries[file_name]
+                results = results + [{"name": file_name, "status": True, "action": "skipped",
+                                      "msg": f"File <{file_name}> unchanged since last upload"} for file_name in skipped_files]
+            if len(failed) > 0:
+                status = False
+                msg_ret = f"Files not uploaded to Directory <{_dest_path}> in share <{_share}>. <{len(failed)}> of <{len(failed) + len(found_files)}> uploads failed"
+            else:
+                status = True
+                msg_ret = f"Files uploaded to Directory <{_dest_path}> in share <{_share}>. Uploaded <{len(found_files)}>, skipped <{len(skipped_files)}>"
         else:
             status = False
             msg_ret = f"Files not uploaded to Directory <{_dest_path}> in share <{_share}>. No file to upload"
+        if _sync:
+            write_manifest(manifest_file, manifest)
       else:
         msg_ret = f"Files not uploaded to Directory <{_dest_path}>. Error: Share <{_share}> not found"
         status = False
@@ -163,7 +446,7 @@ def upload_files(_account_name, _share, _connection_string, _source_path, _sourc
       msg_ret = f"File not uploaded to Directory <{_dest_path}> in share <{_share}>. Error: <{error}>"
       status = False
 
-  return status, msg_ret, found_files
+  return status, msg_ret, found_files, skipped_files, results
 
 
 def main():
@@ -173,9 +456,19 @@ def main():
           share=dict(required=True, type='str'),
           connection_string=dict(required=True, type='str'),
           source_path=dict(required=False, type='str', default=''),
-          files=dict(required=True, type='str'),
-          dest_path=dict(required=False, type='str', default='')
-      )
+          files=dict(required=False, type='str'),
+          include=dict(required=False, type='list', elements='str'),
+          exclude=dict(required=False, type='list', elements='str', default=[]),
+          dest_path=dict(required=False, type='str', default=''),
+          max_concurrency=dict(required=False, type='int', default=8),
+          chunk_size=dict(required=False, type='int', default=4194304),
+          range_threshold=dict(required=False, type='int', default=268435456),
+          sync=dict(required=False, type='bool', default=False),
+          manifest=dict(required=False, type='str', default=''),
+          sparse=dict(required=False, type='bool', default=False),
+          recursive=dict(required=False, type='bool', default=False)
+      ),
+      required_one_of=[['files', 'include']]
   )
 
   account_name = module.params.get("account_name")
@@ -183,14 +476,32 @@ def main():
   connection_string = module.params.get("connection_string")
   source_path = module.params.get("source_path")
   files = module.params.get("files")
+  include = module.params.get("include")
+  exclude = module.params.get("exclude")
+  patterns = ([files] if files else []) + (include or [])
   dest_path = module.params.get("dest_path")
+  max_concurrency = module.params.get("max_concurrency")
+  chunk_size = module.params.get("chunk_size")
+  range_threshold = module.params.get("range_threshold")
+  sync = module.params.get("sync")
+  manifest = module.params.get("manifest")
+  sparse = module.params.get("sparse")
+  recursive = module.params.get("recursive")
+
+  if chunk_size <= 0 or chunk_size > 4194304:
+      module.fail_json(failed=True, msg=f"Invalid chunk_size <{chunk_size}>. Must be between 1 and 4194304", content=[])
+
+  # One pooled transport for every client, sized to the transfer concurrency
+  configure_clients(max_concurrency)
 
-  success, msg_ret, output = upload_files(account_name, share, connection_string, source_path, files, dest_path)
+  success, msg_ret, output, skipped, results = upload_files(account_name, share, connection_string, source_path, patterns, dest_path,
+                                                            max_concurrency, chunk_size, range_threshold, sync, manifest,
+                                                            sparse, recursive, exclude)
 
   if success:
-      module.exit_json(failed=False, msg=msg_ret, content=output)
+      module.exit_json(failed=False, msg=msg_ret, content=output, skipped=skipped, results=results)
   else:
-      module.fail_json(failed=True, msg=msg_ret, content=output)
+      module.fail_json(failed=True, msg=msg_ret, content=output, skipped=skipped, results=results)
 
 if __name__ == "__main__":
     main() 